@@ -0,0 +1,146 @@
+from collections import OrderedDict
+
+import cartopy.crs as ccrs
+import numpy as np
+import xarray as xr
+from metpy.interpolate import geodesic
+
+max_cached_geometries = 32
+
+
+def fractional_index(coord: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Fractional positions of values on a monotonic (ascending or descending) coordinate. NaN outside."""
+    positions = np.arange(len(coord), dtype=float)
+    if coord[0] > coord[-1]:
+        coord, positions = coord[::-1], positions[::-1]
+    index = np.interp(values, coord, positions)
+    index[(values < coord[0]) | (values > coord[-1])] = np.nan
+    return index
+
+
+def parse_points(text: str) -> list:
+    """(lat, lon) tuples from text like '47.3, 11.4; 48.1, 16.2' (points separated by ';' or new lines)"""
+    points = []
+    for item in text.replace('\n', ';').split(';'):
+        if item.strip():
+            lat, lon = (float(value) for value in item.split(','))
+            points.append((lat, lon))
+    return points
+
+
+class CrossSectionGeometry:
+    """Path and horizontal interpolation stencil of a cross section on a regular lat/lon grid.
+    The geodesic path points and the bilinear weights are computed once per (grid, start, end, steps)
+    and cached, so re-plotting a section with other variables or other files skips this step.
+    Fields are interpolated to the path with a single gather and weighted sum.
+    The same stencil serves arbitrary points (get_points), e.g. vertical profiles at stations.
+    """
+    __cache = OrderedDict()
+
+    @classmethod
+    def get(cls, lat, lon, start: tuple, end: tuple, steps: int) -> 'CrossSectionGeometry':
+        """Returns cached geometry or computes it. start and end are (lat, lon) tuples."""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        key = (lat.tobytes(), lon.tobytes(), tuple(start), tuple(end), steps)
+        if key not in cls.__cache:
+            points = geodesic(ccrs.PlateCarree(), start, end, steps)
+            cls.__store(key, cls(lat, lon, points[:, 1], points[:, 0]))
+        return cls.__lookup(key)
+
+    @classmethod
+    def get_points(cls, lat, lon, points: list) -> 'CrossSectionGeometry':
+        """Returns cached or computes the stencil of arbitrary (lat, lon) points, e.g. stations"""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        key = (lat.tobytes(), lon.tobytes(), points.tobytes())
+        if key not in cls.__cache:
+            cls.__store(key, cls(lat, lon, points[:, 0], points[:, 1]))
+        return cls.__lookup(key)
+
+    @classmethod
+    def __store(cls, key, geometry):
+        cls.__cache[key] = geometry
+        if len(cls.__cache) > max_cached_geometries:
+            cls.__cache.popitem(last=False)
+
+    @classmethod
+    def __lookup(cls, key) -> 'CrossSectionGeometry':
+        cls.__cache.move_to_end(key)
+        return cls.__cache[key]
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray, point_lat: np.ndarray, point_lon: np.ndarray):
+        """Stencil of the points (point_lat, point_lon) on the grid (lat, lon)"""
+        self.lon = np.asarray(point_lon, dtype=float)
+        self.lat = np.asarray(point_lat, dtype=float)
+
+        # Longitudes of the points are moved into the range of the grid (e.g. -10 -> 350)
+        lon_on_grid = (self.lon - lon.min()) % 360 + lon.min()
+        # On a global grid the first column follows the last one, no cyclic point has to be added to the data
+        periodic = len(lon) > 1 and np.isclose(lon[-1] - lon[0] + (lon[1] - lon[0]), 360)
+        lon_coord = np.append(lon, lon[0] + 360) if periodic else lon
+        lat_index = fractional_index(lat, self.lat)
+        lon_index = fractional_index(lon_coord, lon_on_grid)
+        self.valid = ~(np.isnan(lat_index) | np.isnan(lon_index))
+        lat_index = np.where(self.valid, lat_index, 0)
+        lon_index = np.where(self.valid, lon_index, 0)
+
+        lat0 = np.clip(np.floor(lat_index).astype(int), 0, max(len(lat) - 2, 0))
+        lon0 = np.clip(np.floor(lon_index).astype(int), 0, max(len(lon_coord) - 2, 0))
+        lat1 = np.minimum(lat0 + 1, len(lat) - 1)
+        lon1 = np.minimum(lon0 + 1, len(lon_coord) - 1) % len(lon)
+        # Grid indices of the four corners around every point, shape (4, points)
+        self.corner_rows = np.stack([lat0, lat0, lat1, lat1])
+        self.corner_columns = np.stack([lon0, lon1, lon0, lon1])
+        lat_weight = lat_index - lat0
+        lon_weight = lon_index - lon0
+
+        # Only the rows and columns touched by the points are read from the fields
+        self.lat_rows, lat_local = np.unique(np.concatenate([lat0, lat1]), return_inverse=True)
+        self.lon_columns, lon_local = np.unique(np.concatenate([lon0, lon1]), return_inverse=True)
+        lat0_local, lat1_local = np.split(lat_local, 2)
+        lon0_local, lon1_local = np.split(lon_local, 2)
+        ncols = len(self.lon_columns)
+        # Stencil: flat indices into the (rows x columns) subset and bilinear weights, shape (4, points)
+        self.stencil = np.stack([lat0_local * ncols + lon0_local, lat0_local * ncols + lon1_local,
+                                 lat1_local * ncols + lon0_local, lat1_local * ncols + lon1_local])
+        self.weights = np.stack([(1 - lat_weight) * (1 - lon_weight), (1 - lat_weight) * lon_weight,
+                                 lat_weight * (1 - lon_weight), lat_weight * lon_weight])
+
+    def indexers(self) -> dict:
+        """Indexers (for isel) of the rows and columns touched by the points"""
+        return {'lat': self.lat_rows, 'lon': self.lon_columns}
+
+    def apply_subset(self, *arrays) -> list:
+        """Like apply, for fields (hybrid, rows, columns) that are restricted to indexers() already"""
+        sections = []
+        for arr in arrays:
+            section = self.__interpolate_subset(np.asarray(arr, dtype=float))
+            section[:, ~self.valid] = np.nan
+            sections.append(section)
+        return sections
+
+    def apply(self, *arrays) -> list:
+        """Interpolates fields with dimensions (hybrid, lat, lon) to the path. Returns arrays (hybrid, steps)."""
+        sections = []
+        for arr in arrays:
+            if getattr(arr, 'chunks', None):
+                # Chunked (lazy) field: only the corner columns are gathered, not the rows x columns block
+                corners = arr.isel({'lat': xr.DataArray(self.corner_rows.ravel(), dims='point'),
+                                    'lon': xr.DataArray(self.corner_columns.ravel(), dims='point')})
+                corners = np.asarray(corners, dtype=float).reshape((-1,) + self.weights.shape)
+                section = (corners * self.weights).sum(axis=1)
+            elif hasattr(arr, 'isel'):
+                subset = np.asarray(arr.isel({'lat': self.lat_rows, 'lon': self.lon_columns}), dtype=float)
+                section = self.__interpolate_subset(subset)
+            else:
+                subset = np.asarray(arr, dtype=float)[:, self.lat_rows][:, :, self.lon_columns]
+                section = self.__interpolate_subset(subset)
+            section[:, ~self.valid] = np.nan
+            sections.append(section)
+        return sections
+
+    def __interpolate_subset(self, subset: np.ndarray) -> np.ndarray:
+        flat = subset.reshape(subset.shape[0], -1)
+        return (flat[:, self.stencil] * self.weights).sum(axis=1)
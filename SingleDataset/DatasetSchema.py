@@ -0,0 +1,35 @@
+from os import path
+
+import xarray as xr
+
+
+class DatasetSchema:
+    """Variable names of a dataset file, read once from the file header and cached per file layout.
+    Files in the same directory are expected to share their layout (e.g. the ERA5 files of one month),
+    so a timeseries only inspects one file per directory.
+    Used to open a dataset with just the variables a plot needs.
+    """
+    __cache = dict()
+
+    @classmethod
+    def layout(cls, filepath) -> tuple:
+        """Key of the layout a file belongs to"""
+        filepath = path.realpath(filepath)
+        return path.dirname(filepath), path.splitext(filepath)[1]
+
+    @classmethod
+    def get(cls, filepath) -> 'DatasetSchema':
+        key = cls.layout(filepath)
+        if key not in cls.__cache:
+            cls.__cache[key] = cls(filepath)
+        return cls.__cache[key]
+
+    def __init__(self, filepath):
+        # Opening without decoding only reads the header, no data
+        with xr.open_dataset(filepath, decode_cf=False, decode_times=False) as dset:
+            self.variables = tuple(dset.data_vars)
+
+    def dropvars(self, needed) -> list:
+        """Variables to drop when only the needed ones (and PRESS) are used"""
+        keep = set(needed) | {'PRESS'}
+        return [var for var in self.variables if var not in keep]
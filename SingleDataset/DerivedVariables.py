@@ -0,0 +1,75 @@
+import numpy as np
+import xarray as xr
+
+from SingleDataset.LayerIntegrator import pascal_per_unit
+from SingleDataset.VerticalInterpolator import da
+
+kappa = 0.2857  # R/cp of dry air
+
+
+def wind_speed(u, v, attrs):
+    return np.hypot(u, v)
+
+
+def wind_direction(u, v, attrs):
+    """Direction the wind blows from, in degrees (meteorological convention)"""
+    return (270 - np.rad2deg(np.arctan2(v, u))) % 360
+
+
+def potential_temperature(temp, press, attrs):
+    pascal = pascal_per_unit.get(attrs[1].get('units', 'hPa'), 100.)
+    return temp * (100000 / (press * pascal)) ** kappa
+
+
+class DerivedVariable:
+    """Variable computed from variables of the file by a pointwise expression. The expression is evaluated
+    lazily with dask: the inputs are split into chunks of one hybrid level (or keep their chunks on the chunked
+    backend), so slicing the variable (area, hybrid levels, cross section stencils) only reads and computes the
+    chunks of the inputs that are selected. Without dask the variable is computed when it is added.
+    """
+
+    def __init__(self, inputs: list, function, long_name: str, units: str = None):
+        """:param function: Called with the input arrays (same shape) and the attributes of the inputs (attrs)
+        :param units: Units of the result, None takes the units of the first input"""
+        self.inputs = inputs
+        self.function = function
+        self.long_name = long_name
+        self.units = units
+
+    def data_array(self, dset: xr.Dataset, name: str) -> xr.DataArray:
+        """Lazy DataArray of the variable on the grid of the (lazily opened) dataset"""
+        inputs = [dset[var] for var in self.inputs]
+        dims = inputs[0].dims
+        for var, d_arr in zip(self.inputs, inputs):
+            if d_arr.dims != dims:
+                raise Exception(f"Input {var} of {name} has dimensions {d_arr.dims} instead of {dims}")
+        attrs = [d_arr.attrs for d_arr in inputs]
+        if da is not None and inputs[0].chunks is None:
+            inputs = [d_arr.chunk({dims[0]: 1}) for d_arr in inputs]
+        d_arr = xr.apply_ufunc(self.function, *inputs, kwargs={'attrs': attrs}, dask='allowed')
+        d_arr.attrs = {'long_name': self.long_name,
+                       'units': self.units if self.units is not None else attrs[0].get('units', '')}
+        return d_arr.rename(name)
+
+
+# Registry of the derived variables, stored variables of the same name take precedence
+derived_variables = {
+    'WSPD': DerivedVariable(['U', 'V'], wind_speed, 'Horizontal wind speed'),
+    'WDIR': DerivedVariable(['U', 'V'], wind_direction, 'Wind direction', units='degree'),
+    'THETA': DerivedVariable(['TEMP', 'PRESS'], potential_temperature, 'Potential temperature', units='K'),
+}
+
+
+def available(stored) -> list:
+    """Names of the derived variables that can be computed from the stored variables (and are not stored)"""
+    return [name for name, variable in derived_variables.items()
+            if name not in stored and all(var in stored for var in variable.inputs)]
+
+
+def stored_inputs(varnames, stored) -> list:
+    """Stored variables needed for varnames, derived variables are replaced by their inputs"""
+    needed = []
+    for name in varnames:
+        inputs = derived_variables[name].inputs if name not in stored and name in derived_variables else [name]
+        needed.extend(var for var in inputs if var not in needed)
+    return needed
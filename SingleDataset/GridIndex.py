@@ -0,0 +1,86 @@
+import numpy as np
+import xarray as xr
+
+tolerance = 1e-6  # degrees, coordinates closer than this to an area bound are still inside
+
+
+class GridIndex:
+    """Coordinate index of a lat/lon grid. Turns areas given in degrees into index slices with searchsorted,
+    independent of the resolution, for ascending or descending latitudes and for longitudes in [0, 360)
+    as well as in [-180, 180). Areas crossing the end of the longitude axis are returned as two contiguous slabs.
+    """
+    __cache = dict()
+
+    @classmethod
+    def get(cls, lat, lon) -> 'GridIndex':
+        """Returns cached index for the coordinates"""
+        lat = np.asarray(lat, dtype=float)
+        lon = np.asarray(lon, dtype=float)
+        key = (lat.tobytes(), lon.tobytes())
+        if key not in cls.__cache:
+            cls.__cache[key] = cls(lat, lon)
+        return cls.__cache[key]
+
+    def __init__(self, lat: np.ndarray, lon: np.ndarray):
+        self.lat = lat
+        self.lon = lon
+        self.lat_descending = len(lat) > 1 and lat[0] > lat[-1]
+        self.lat_ascending = lat[::-1] if self.lat_descending else lat
+
+    def lat_slice(self, bottom: float, top: float) -> slice:
+        start = int(np.searchsorted(self.lat_ascending, bottom - tolerance, side='left'))
+        stop = int(np.searchsorted(self.lat_ascending, top + tolerance, side='right'))
+        if self.lat_descending:
+            return slice(len(self.lat) - stop, len(self.lat) - start)
+        return slice(start, stop)
+
+    def lon_slices(self, left: float, right: float) -> list:
+        """One slice, or two slices (west part, east part) if the area wraps around the end of the grid"""
+        if right - left >= 360 - tolerance:
+            return [slice(0, len(self.lon))]
+        lon0 = self.lon[0]
+        left = (left - lon0) % 360 + lon0
+        right = (right - lon0) % 360 + lon0
+        start = int(np.searchsorted(self.lon, left - tolerance, side='left'))
+        stop = int(np.searchsorted(self.lon, right + tolerance, side='right'))
+        if left <= right:
+            return [slice(start, stop)]
+        return [slice(start, len(self.lon)), slice(0, stop)]
+
+    def slabs(self, area: dict) -> list:
+        """List of (lat slice, lon slice) covering the area. Keys of area: ['right', 'left', 'top', 'bottom']"""
+        lat_slice = self.lat_slice(area['bottom'], area['top'])
+        return [(lat_slice, lon_slice) for lon_slice in self.lon_slices(area['left'], area['right'])]
+
+    def lon_columns(self, area: dict) -> tuple:
+        """Column indices of the area from west to east (a slice if contiguous) and their longitudes in the frame
+        of the requested area, like select"""
+        slices = self.lon_slices(area['left'], area['right'])
+        if len(slices) == 1:
+            return slices[0], self.lon[slices[0]]
+        shift = self.__wrap_shift(area)
+        west, east = (np.arange(len(self.lon))[lon_slice] for lon_slice in slices)
+        return np.concatenate([west, east]), np.concatenate([self.lon[west] + shift, self.lon[east] + shift + 360])
+
+    def __wrap_shift(self, area: dict) -> float:
+        """Shift of the western slab of a wrapped area into the frame of the requested area (the eastern slab
+        is shifted by 360 more), e.g. 350 -> -10 for left=-10 on a [0, 360) grid or -180 -> 180 for right=180
+        on a [-180, 180) grid"""
+        lon0 = self.lon[0]
+        return area['left'] - ((area['left'] - lon0) % 360 + lon0)
+
+    def select(self, obj, area: dict):
+        """Selects the area of a DataArray or Dataset on this grid"""
+        slabs = self.slabs(area)
+        if len(slabs) == 1:
+            return obj.isel({'lat': slabs[0][0], 'lon': slabs[0][1]})
+        # Area wraps around the end of the longitude axis: two contiguous slabs (west to east) instead of
+        # a gathered copy. Longitudes are shifted into the frame of the requested area to be continuous
+        west, east = (obj.isel({'lat': lat_slice, 'lon': lon_slice}) for lat_slice, lon_slice in slabs)
+        shift = self.__wrap_shift(area)
+        if shift != 0:
+            west = west.assign_coords(lon=west['lon'] + shift)
+        east = east.assign_coords(lon=east['lon'] + shift + 360)
+        if isinstance(obj, xr.Dataset):  # Variables without longitude (e.g. a, b) are taken from the first slab
+            return xr.concat([west, east], dim='lon', data_vars='minimal', coords='minimal', compat='override')
+        return xr.concat([west, east], dim='lon')
@@ -0,0 +1,106 @@
+import numpy as np
+
+from SingleDataset.VerticalInterpolator import VerticalInterpolator, da, target_levels
+
+gravity = 9.80665  # m/s^2
+pascal_per_unit = {'Pa': 1., 'hPa': 100., 'mbar': 100., 'millibar': 100., 'hectopascal': 100., 'kPa': 1000.}
+operations = ['mean', 'integral']
+
+
+def layer(top, bottom, operation: str = 'mean') -> dict:
+    """Vertical reduction over the layer between the pressure levels top and bottom (values with unit).
+    Accepted wherever a pressure level is (see reduce_vertically). operation is 'mean' or 'integral'."""
+    if operation not in operations:
+        raise Exception(f"Unknown layer operation '{operation}', possible operations: {operations}")
+    return {'top': top, 'bottom': bottom, 'operation': operation}
+
+
+def is_layer(plev) -> bool:
+    return isinstance(plev, dict)
+
+
+def layer_bounds(plev: dict, press) -> np.ndarray:
+    """[top, bottom] of a layer as magnitudes in the units of the PRESS field, top < bottom"""
+    return np.sort(np.concatenate([target_levels(plev['top'], press), target_levels(plev['bottom'], press)]))
+
+
+def reduce_vertically(press, plev, *arrays) -> list:
+    """Interpolates the arrays (same shape as the pressure field) to the pressure level(s) plev or, for a layer,
+    reduces them over the layer. Returns arrays with the levels as first axis (a single one for layers)."""
+    if is_layer(plev):
+        top, bottom = layer_bounds(plev, press)
+        units = press.attrs.get('units', 'hPa') if hasattr(press, 'attrs') else 'hPa'
+        integrator = LayerIntegrator(press, top, bottom, pascal_per_unit.get(units, 100.))
+        return [values[np.newaxis] for values in getattr(integrator, plev['operation'])(*arrays)]
+    return VerticalInterpolator(press, target_levels(plev, press)).apply(*arrays)
+
+
+class LayerIntegrator:
+    """Pressure weighted layer means and column integrals on the hybrid levels, without interpolating to
+    pressure levels first. The variables are taken as piecewise linear in pressure between the levels, every
+    level gets the weight (in pressure) of its share of the integral over [top, bottom]. Partly covered layers
+    at the bounds get partial weights. Weights are computed once per pressure field and bounds and are then
+    applied to any number of variables. Parts of the layer outside of the column (e.g. below the surface)
+    are left out, the mean is taken over the covered part.
+    """
+
+    def __init__(self, press, top: float, bottom: float, pascal: float = 100.):
+        """:param top, bottom: Bounds of the layer in the units of press
+        :param pascal: Pascal per unit of press, for integrals in SI units"""
+        xp = np.asarray(press, dtype=float)
+        self.pascal = pascal
+
+        # Sort the vertical axis only if the pressure is not increasing already (the usual case for hybrid levels)
+        sorter = None
+        if xp.shape[0] > 1 and not np.all(xp[1:] >= xp[:-1]):
+            sorter = np.argsort(xp, axis=0)
+            xp = np.take_along_axis(xp, sorter, axis=0)
+
+        upper, lower = xp[:-1], xp[1:]  # Segments between adjacent levels
+        lo = np.clip(upper, top, bottom)
+        hi = np.clip(lower, top, bottom)
+        width = hi - lo  # Covered part of the segment, 0 outside of the layer
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t_lo = np.where(lower > upper, (lo - upper) / (lower - upper), 0)
+            t_hi = np.where(lower > upper, (hi - upper) / (lower - upper), 0)
+        weights = np.zeros(xp.shape)
+        weights[:-1] += width * (2 - t_lo - t_hi) / 2
+        weights[1:] += width * (t_lo + t_hi) / 2
+
+        if sorter is not None:
+            unsorted = np.empty_like(weights)
+            np.put_along_axis(unsorted, sorter, weights, axis=0)
+            weights = unsorted
+        self.weights = weights
+
+    def integral(self, *arrays) -> list:
+        """Column integrals (1/g) * integral of the arrays dp over the layer, e.g. kg/m^2 for specific humidity.
+        NaNs are left out."""
+        return [values * self.pascal / gravity for values in self.__weighted_sums(arrays)[0]]
+
+    def mean(self, *arrays) -> list:
+        """Pressure weighted means of the arrays over the layer. NaN where the layer is not covered."""
+        sums, covered = self.__weighted_sums(arrays)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return list(np.where(covered > 0, sums / covered, np.nan))
+
+    def __weighted_sums(self, arrays) -> tuple:
+        stacked = np.stack([np.asarray(arr, dtype=float) for arr in arrays])
+        finite = np.isfinite(stacked)
+        sums = np.where(finite, stacked, 0) * self.weights[np.newaxis]
+        return sums.sum(axis=1), (finite * self.weights[np.newaxis]).sum(axis=1)
+
+
+def reduce_layer_blocks(press, arrays, top: float, bottom: float, operation: str, pascal: float = 100.) -> list:
+    """Lazy, blockwise version of LayerIntegrator(press, top, bottom).<operation>(*arrays) for dask arrays
+    that are chunked horizontally only (see interpolate_blocks)"""
+    press = da.asarray(press).rechunk({0: -1})
+    stacked = da.stack([da.asarray(arr).rechunk(press.chunks) for arr in arrays]).rechunk({0: -1})
+
+    def reduce_block(stacked_block, press_block):
+        integrator = LayerIntegrator(press_block[0], top, bottom, pascal)
+        return np.stack(getattr(integrator, operation)(*stacked_block))
+
+    reduced = da.map_blocks(reduce_block, stacked, press[np.newaxis], dtype=float, drop_axis=1,
+                            chunks=((len(arrays),),) + press.chunks[1:])
+    return [reduced[i] for i in range(len(arrays))]
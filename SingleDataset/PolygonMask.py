@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+from matplotlib.path import Path
+from shapely import wkt
+from shapely.geometry import shape
+from shapely.ops import unary_union
+
+from SingleDataset.GridIndex import GridIndex, tolerance
+from Timeseries.ResultCache import create_cache_dir, default_cache_dir, make_shared
+
+
+def parse_polygon(polygon):
+    """Geometry from WKT, GeoJSON (geometry, Feature or FeatureCollection) as string or dict"""
+    if isinstance(polygon, str) and not polygon.lstrip().startswith('{'):
+        return wkt.loads(polygon)
+    geojson = json.loads(polygon) if isinstance(polygon, str) else polygon
+    if geojson.get('type') == 'FeatureCollection':
+        return unary_union([shape(feature['geometry']) for feature in geojson['features']])
+    return shape(geojson.get('geometry', geojson))
+
+
+def is_polygon(area: dict) -> bool:
+    """Regions are either rectangles (keys ['right', 'left', 'top', 'bottom']) or polygons (key 'polygon')"""
+    return 'polygon' in area
+
+
+class PolygonMask:
+    """Polygon region rasterized on a lat/lon grid: indices of the cells whose centres lie inside the polygon.
+    Rasterized once per grid and geometry and cached in memory and on disk, so files on the same grid
+    only gather the covered cells.
+    """
+    __cache = dict()
+
+    @classmethod
+    def get(cls, grid: GridIndex, polygon, cache_dir: str = None) -> 'PolygonMask':
+        geometry = parse_polygon(polygon)
+        digest = hashlib.sha256()
+        for part in (grid.lat.tobytes(), grid.lon.tobytes(), geometry.wkt.encode()):
+            digest.update(part)
+        key = digest.hexdigest()
+        if key not in cls.__cache:
+            cls.__cache[key] = cls.__load_or_rasterize(grid, geometry, key, cache_dir or default_cache_dir())
+        return cls.__cache[key]
+
+    @classmethod
+    def __load_or_rasterize(cls, grid, geometry, key, cache_dir) -> 'PolygonMask':
+        mask_path = os.path.join(cache_dir, 'masks', key + '.npz')
+        try:
+            with np.load(mask_path) as cached:
+                return cls(cached['rows'], cached['columns'])
+        except (OSError, KeyError, ValueError):
+            pass
+        mask = cls(*cls.rasterize(grid, geometry))
+        try:
+            create_cache_dir(os.path.dirname(mask_path))
+            tmp_path = f"{mask_path}.{os.getpid()}.tmp.npz"
+            np.savez(tmp_path, rows=mask.rows, columns=mask.columns)
+            os.replace(tmp_path, mask_path)  # Readers never see a partially written mask
+            make_shared(mask_path)
+        except OSError:
+            pass  # Without a writable cache directory the mask is only kept in memory
+        return mask
+
+    @staticmethod
+    def rasterize(grid: GridIndex, geometry) -> tuple:
+        """Returns (rows, columns) of the covered cells, cell centres on the boundary are inside (like for
+        rectangles). A polygon smaller than a cell covers the nearest cell."""
+        covered = np.zeros((len(grid.lat), len(grid.lon)), dtype=bool)
+        geometry = geometry.buffer(tolerance)
+        polygons = geometry.geoms if hasattr(geometry, 'geoms') else [geometry]
+        for polygon in polygons:
+            hit = False
+            left, bottom, right, top = polygon.bounds
+            rows = np.flatnonzero((grid.lat >= bottom) & (grid.lat <= top))
+            # Longitudes of the grid are moved into the range of the polygon (e.g. 350 -> -10)
+            lon = (grid.lon - left) % 360 + left
+            columns = np.flatnonzero(lon <= right)
+            if rows.size > 0 and columns.size > 0:
+                points = np.column_stack([np.tile(lon[columns], rows.size), np.repeat(grid.lat[rows], columns.size)])
+                inside = Path(np.asarray(polygon.exterior.coords)).contains_points(points)
+                for hole in polygon.interiors:
+                    inside &= ~Path(np.asarray(hole.coords)).contains_points(points)
+                inside = inside.reshape(rows.size, columns.size)
+                covered[np.ix_(rows, columns)] |= inside
+                hit = inside.any()
+            if not hit:
+                centre = polygon.representative_point()
+                row = np.argmin(np.abs(grid.lat - centre.y))
+                column = np.argmin(np.abs((grid.lon - centre.x + 180) % 360 - 180))
+                covered[row, column] = True
+        return np.nonzero(covered)
+
+    def __init__(self, rows: np.ndarray, columns: np.ndarray):
+        self.rows = np.asarray(rows, dtype=np.intp)
+        self.columns = np.asarray(columns, dtype=np.intp)
+
+    def indexers(self) -> dict:
+        """Indexers (for isel) of the bounding box of the covered cells"""
+        return {'lat': slice(int(self.rows.min()), int(self.rows.max()) + 1),
+                'lon': slice(int(self.columns.min()), int(self.columns.max()) + 1)}
@@ -3,6 +3,7 @@ from metpy.units import units
 import matplotlib.pyplot as plt
 import matplotlib.patches as mplpatches
 
+from SingleDataset.CrossSectionGeometry import parse_points
 from SingleDataset.DebugCapturer import dbg
 from SingleDataset import Plotconfiguration as pconf
 from SingleDataset.SDModel import SDModel
@@ -18,9 +19,14 @@ class SDController:
         self.start_end_cords = []  # will contain start and endpoint as to dicts with 'lat' and 'lon' as keys
         self.x_ax_var = 'index'
         self.csec_steps = 100
+        # layer-specific parameters:
+        self.layer_top = 500 * units.hPa
+        self.layer_bottom = 850 * units.hPa
+        # profile-specific parameters:
+        self.profile_points = []  # (lat, lon) tuples
         # hplot-specific parameters:
         # self.area = None  # {'left': 0, 'right': 10, 'top': 10, 'bottom': 0}
-        self.hplot_level = (0, 0)  # (index, Value)
+        self.hplot_level = None  # Pressure level value with unit
         self.configs = dict()
 
     def get_all_var_names(self):
@@ -51,7 +57,11 @@ class SDController:
 
     def set_hplot_plev(self, level):
         if level is not None:
-            self.hplot_level = (list(self.get_plevs())[::-1].index(level), level)
+            self.hplot_level = level
+
+    def set_chunk_budget(self, chunk_mb):
+        """Chunk size in MB for the chunked backend, 0 keeps whole fields in memory"""
+        self.model.set_chunk_budget(chunk_mb * 1024 ** 2 if chunk_mb > 0 else None)
 
     def set_csec_xvar(self, x_ax_var):
         self.x_ax_var = x_ax_var
@@ -59,9 +69,21 @@ class SDController:
     def set_csec_steps(self, steps):
         self.csec_steps = steps
 
+    def set_layer(self, top, bottom):
+        """Bounds of the layer in hPa"""
+        self.layer_top = top * units.hPa
+        self.layer_bottom = bottom * units.hPa
+
+    def set_profile_points(self, points):
+        """Points as text, e.g. '47.3, 11.4; 48.1, 16.2'"""
+        try:
+            self.profile_points = parse_points(points)
+        except ValueError as e:
+            print(f"Invalid points: {e}")
+
     def open_dset(self, path):
         if not self.model.dataset_opened():
-            self.model.open_dset(path)
+            self.model.open_dset(path, varnames=[])  # Variables are opened when added to the plot
             self.view.update_viable_vars(self.get_all_var_names())
 
     def add_var(self, varname):
@@ -78,12 +100,27 @@ class SDController:
         elif len(self.model.get_plotvar_names()) == 0:
             raise Exception('No variables added to plot')
         if plottype == SDModel.plottypes[1]:
-            self.model.do_horizontal_plot(self.plevs, self.hplot_level, area=self.view.areaSelection.get_area())
+            if self.hplot_level is None:
+                raise Exception('No pressurelevel selected')
+            self.model.do_horizontal_plot(self.hplot_level, area=self.view.areaSelection.get_area())
         elif plottype == SDModel.plottypes[0]:
             if len(self.start_end_cords) != 2:
                 raise Exception('Start-/Endpoint not selected')
             self.model.do_csec_plot(self.plevs, self.start_end_cords[0], self.start_end_cords[1],
                                     x_ax_var=self.x_ax_var, steps=self.csec_steps)
+        elif plottype in SDModel.plottypes[5:7]:
+            self.model.do_layer_plot(self.layer_top, self.layer_bottom,
+                                     operation='mean' if plottype == SDModel.plottypes[5] else 'integral',
+                                     area=self.view.areaSelection.get_area())
+        elif plottype == SDModel.plottypes[4]:
+            if len(self.profile_points) == 0:
+                raise Exception('No points for the profiles given')
+            self.model.do_profile_plot(self.plevs, self.profile_points)
+        elif plottype in SDModel.plottypes[2:4]:
+            if len(self.plevs) == 0:
+                raise Exception('No pressurelevels set')
+            self.model.do_mean_section_plot(self.plevs, dim='lon' if plottype == SDModel.plottypes[2] else 'lat',
+                                            area=self.view.areaSelection.get_area())
         self.model.reset_data_vars()
 
     def on_click_on_map(self, event):
@@ -1,49 +1,88 @@
-from metpy.interpolate import cross_section
-from metpy.interpolate import log_interpolate_1d
 import matplotlib.pyplot as plt
-from cartopy.util import add_cyclic_point
 import cartopy.crs as ccrs
 import numpy as np
 import xarray as xr
+from SingleDataset.CrossSectionGeometry import CrossSectionGeometry
+from SingleDataset.DatasetSchema import DatasetSchema
 from SingleDataset.DebugCapturer import dbg
+from SingleDataset.DerivedVariables import available, derived_variables, stored_inputs
+from SingleDataset.GridIndex import GridIndex
+from SingleDataset.LayerIntegrator import LayerIntegrator, layer, layer_bounds, pascal_per_unit, reduce_layer_blocks
+from SingleDataset.PolygonMask import PolygonMask, is_polygon
+from SingleDataset.VerticalInterpolator import VerticalInterpolator, bracketing_levels, interpolate_blocks, \
+    target_levels, da
 
 class SDModel:
-    plottypes = ['Cross Section', 'Horizontal']
-    def __init__(self):
+    plottypes = ['Cross Section', 'Horizontal', 'Zonal Mean', 'Meridional Mean', 'Vertical Profiles', 'Layer Mean',
+                 'Layer Integral']
+    def __init__(self, chunk_budget: int = None):
         self.data = None
+        self.path = None
+        self.chunk_budget = chunk_budget  # Bytes per chunk of a variable. None: plain numpy backend (no dask)
         self.__press_inter = None
         self.var_conf = dict()  # Maps Variable name to  tuple of DataArray and Plotconfiguration
 
     def get_all_var_names(self):
         if self.dataset_opened():
-            return list(self.data.data_vars)
+            stored = DatasetSchema.get(self.path).variables
+            return list(stored) + available(stored)
         else:
             return ['No Dataset opened']
 
     def get_plotvar_names(self):
         return self.var_conf.keys()
 
-    def get_mean(self, area, plevs, level):
-        self.slice_to_area(area)
-        self.interpolate(plevs)
-        means = []
-        for name, (d_arr, conf) in self.var_conf.items():
-            means.append(np.nanmean(d_arr[level]))
-        self.reset_data_vars()
-        return tuple(means)
-
     def dataset_opened(self) -> bool:
         return self.data is not None
 
     @dbg.capture()
-    def open_dset(self, path='./data/era5_19120612.nc', dropvars=[]):
+    def open_dset(self, path='./data/era5_19120612.nc', dropvars=None, varnames=None):
+        """Opens the dataset lazily. If varnames is given, only these variables and PRESS are opened
+        (the other variables are looked up in the cached schema of the file layout), else all but dropvars.
+        Derived variables (see DerivedVariables) in varnames are added lazily, only their inputs are opened."""
+        derived = []
+        if varnames is not None:
+            stored = DatasetSchema.get(path).variables
+            derived = [name for name in varnames if name not in stored and name in derived_variables]
+            dropvars = DatasetSchema.get(path).dropvars(stored_inputs(varnames, stored))
+        self.path = path
         self.data = xr.open_dataset(path,
                                     group=None,
-                                    drop_variables=dropvars).squeeze()  # Squeeze notwendig für Interpolation (streicht time als dimension)
+                                    drop_variables=dropvars or []).squeeze()  # Squeeze notwendig für Interpolation (streicht time als dimension)
         #self.data = self.data.metpy.parse_cf()  # Wird u.a. benötigt, um cross_section() nutzen zu können
+        if self.chunk_budget is not None:
+            if da is None:
+                print('dask is not installed, data is not chunked')
+            else:
+                self.data = self.data.chunk(self.__horizontal_chunks(self.data['PRESS'], self.chunk_budget))
+        for name in derived:  # Added after chunking, so they are computed on the chunks of their inputs
+            self.data[name] = derived_variables[name].data_array(self.data, name)
         self.__press_inter = self.data['PRESS']
 
+    def set_chunk_budget(self, chunk_budget: int = None):
+        """Switches to the chunked (dask) backend with chunks of at most chunk_budget bytes per variable,
+        or back to the numpy backend with None. An opened dataset is reopened."""
+        self.chunk_budget = chunk_budget
+        if self.dataset_opened():
+            self.open_dset(self.path, varnames=list(self.var_conf.keys()))
+            self.reset_data_vars()
+
+    @staticmethod
+    def __horizontal_chunks(press, chunk_budget: int) -> dict:
+        """Chunks holding whole columns (the vertical interpolation needs all levels) within the budget"""
+        vertical, lat, lon = press.dims
+        # Interpolated values are float64, even if the file stores float32
+        columns = max(1, chunk_budget // (press.sizes[vertical] * max(press.dtype.itemsize, 8)))
+        if columns >= press.sizes[lon]:
+            return {vertical: -1, lat: min(press.sizes[lat], columns // press.sizes[lon]), lon: -1}
+        return {vertical: -1, lat: 1, lon: columns}
+
     def add_var_to_plot(self, varname, pltconf=None):  #  Changed to standardvalue None___
+        if varname not in self.data.data_vars and (varname in DatasetSchema.get(self.path).variables or
+                                                   varname in derived_variables):
+            # Variable was not opened yet: reopen with the added variables (reads the header only)
+            self.open_dset(self.path, varnames=list(self.var_conf.keys()) + [varname])
+            self.reset_data_vars()
         self.var_conf[varname] = (self.data[varname], pltconf)
 
     def remove_var(self, varname):
@@ -55,60 +94,64 @@ class SDModel:
         for name in self.var_conf.keys():
             self.var_conf[name] = (self.data[name], self.var_conf[name][1])
 
-    @dbg.capture()
-    def add_cyclic_points(self) -> None:
-        press_cyc, lons = add_cyclic_point(self.__press_inter, np.array(self.__press_inter['lon'].values, dtype=int))
-        d_arr = xr.DataArray(data=press_cyc,
-                             dims=['hybrid', 'lat', 'lon'],
-                             coords={'hybrid': ('hybrid', self.__press_inter['hybrid']),
-                                     'lat': ('lat', self.__press_inter['lat']),
-                                     'lon': ('lon', lons)},
-                             attrs=self.__press_inter.attrs)
-        d_set = xr.Dataset({'PRESS': d_arr},
-                           coords={'hybrid': ('hybrid', d_arr['hybrid']),
-                                   'lat': ('lat', d_arr['lat']),
-                                   'lon': ('lon', lons)},
-                           )
-        self.__press_inter = d_set.metpy.parse_cf(varname='PRESS')
-        for name, (d_arr, conf) in list(self.var_conf.items()):
-            d_arr_cyc, lons = add_cyclic_point(d_arr.values, np.array(d_arr['lon'].values, dtype=int))
-            d_arr = xr.DataArray(data=d_arr_cyc,
-                                 dims=['hybrid', 'lat', 'lon'],
-                                 coords={'hybrid': ('hybrid', d_arr['hybrid']),
-                                         'lat': ('lat', d_arr['lat']),
-                                         'lon': ('lon', lons)},
-                                 attrs=d_arr.attrs)
-            d_set = xr.Dataset({name: d_arr},
-                               coords={'hybrid': ('hybrid', d_arr['hybrid']),
-                                       'lat': ('lat', d_arr['lat']),
-                                       'lon': ('lon', lons)},
-                               )
-            d_arr = d_set.metpy.parse_cf(varname=name)
-            self.var_conf[name] = (d_arr, conf)
-
     @dbg.capture()
     def interpolate_csec(self, plevs, start, end, steps=100):
         start = (start['lat'], start['lon'])
         end = (end['lat'], end['lon'])
-        xp_interp = cross_section(self.__press_inter, start, end, steps=steps)
-        for name, (d_arr, conf) in list(self.var_conf.items()):
-            d_arr = cross_section(d_arr, start, end, steps=steps)
-            d_arr_interp = log_interpolate_1d(plevs, xp_interp, d_arr)
+        # Path and horizontal stencil are cached and shared by PRESS and all variables
+        geometry = CrossSectionGeometry.get(self.__press_inter['lat'].values, self.__press_inter['lon'].values,
+                                            start, end, steps)
+        names = list(self.var_conf.keys())
+        sections = geometry.apply(self.__press_inter, *[self.var_conf[name][0] for name in names])
+        interpolator = VerticalInterpolator(sections[0], target_levels(plevs, self.__press_inter))
+        for name, d_arr_interp in zip(names, interpolator.apply(*sections[1:])):
+            d_arr, conf = self.var_conf[name]
             # Back to DataArray:
             d_arr_interp = xr.DataArray(data=d_arr_interp,
                                         dims=['plevs', 'index'],
-                                        coords={'lat': ('index', d_arr['lat']),
-                                                'lon': ('index', d_arr['lon']),
+                                        coords={'lat': ('index', geometry.lat),
+                                                'lon': ('index', geometry.lon),
                                                 'plevs': ('plevs', plevs),
-                                                'index': ('index', d_arr['index'])},
+                                                'index': ('index', np.arange(steps))},
                                         attrs=d_arr.attrs)  # Anpassen, nicht identisch
             # Change dict entry for interpolated values
             self.var_conf[name] = (d_arr_interp, conf)
 
+    @dbg.capture()
+    def interpolate_profiles(self, plevs, points: list):
+        """Interpolates the added variables to vertical profiles at many (lat, lon) points: the horizontal
+        stencil is computed once (and cached) for all points, then all columns are interpolated to plevs
+        in one batched call."""
+        geometry = CrossSectionGeometry.get_points(self.__press_inter['lat'].values, self.__press_inter['lon'].values,
+                                                   points)
+        names = list(self.var_conf.keys())
+        columns = geometry.apply(self.__press_inter, *[self.var_conf[name][0] for name in names])
+        interpolator = VerticalInterpolator(columns[0], target_levels(plevs, self.__press_inter))
+        for name, d_arr_interp in zip(names, interpolator.apply(*columns[1:])):
+            d_arr, conf = self.var_conf[name]
+            # Back to DataArray:
+            d_arr_interp = xr.DataArray(data=d_arr_interp,
+                                        dims=['plevs', 'point'],
+                                        coords={'lat': ('point', geometry.lat),
+                                                'lon': ('point', geometry.lon),
+                                                'plevs': ('plevs', plevs),
+                                                'point': ('point', np.arange(len(geometry.lat)))},
+                                        attrs=d_arr.attrs)
+            self.var_conf[name] = (d_arr_interp, conf)
+
     @dbg.capture()
     def interpolate(self, plevs):
-        for name, (d_arr, conf) in list(self.var_conf.items()):
-            d_arr_interp = log_interpolate_1d(plevs, self.__press_inter, d_arr)
+        """Interpolates added variables to plevs. Accepts a single level as well, then only this level is computed."""
+        plevs = np.atleast_1d(plevs)
+        levels = target_levels(plevs, self.__press_inter)
+        self.select_levels(levels)
+        if self.__press_inter.chunks:  # Chunked backend: stays lazy, computed block by block when plotted
+            interpolated = interpolate_blocks(self.__press_inter.data, [d_arr.data for d_arr, conf in
+                                                                        self.var_conf.values()], levels)
+        else:
+            interpolator = VerticalInterpolator(self.__press_inter, levels)
+            interpolated = interpolator.apply(*[d_arr for d_arr, conf in self.var_conf.values()])
+        for (name, (d_arr, conf)), d_arr_interp in zip(list(self.var_conf.items()), interpolated):
             # Back to DataArray:
             d_arr_interp = xr.DataArray(data=d_arr_interp,
                                         dims=['plevs', 'lat', 'lon'],
@@ -119,36 +162,123 @@ class SDModel:
             # Change dict entry for interpolated values
             self.var_conf[name] = (d_arr_interp, conf)
 
+    @dbg.capture()
+    def interpolate_mean_section(self, plevs, dim='lon', area=None):
+        """Averages PRESS and the added variables over dim ('lon': zonal mean, 'lat': meridional mean) on the
+        hybrid levels in one vectorized reduction, then interpolates the reduced 2-D fields to plevs.
+        Only the averaged pressure is interpolated, not the full 3-D field.
+        :param area: Rectangle or polygon (see slice_to_area) to average over, None for the whole grid
+        """
+        mask = None
+        if area is not None:
+            if is_polygon(area):
+                mask = PolygonMask.get(GridIndex.get(self.__press_inter['lat'].values,
+                                                     self.__press_inter['lon'].values), area['polygon'])
+            self.slice_to_area(area)
+        # The levels bracketing plevs in every column also bracket plevs in the mean pressure
+        self.select_levels(target_levels(plevs, self.__press_inter))
+        names = list(self.var_conf.keys())
+        arrays = [self.__press_inter] + [self.var_conf[name][0] for name in names]
+        backend = da if self.__press_inter.chunks else np
+        stacked = backend.stack([arr.data for arr in arrays])
+        if mask is not None:  # Cells of the bounding box outside of the polygon are left out
+            covered = np.zeros(stacked.shape[-2:], dtype=bool)
+            covered[mask.rows - mask.rows.min(), mask.columns - mask.columns.min()] = True
+            stacked = backend.where(covered, stacked, np.nan)
+        axis = 1 + self.__press_inter.dims.index(dim)
+        reduced = np.asarray(backend.nanmean(stacked, axis=axis), dtype=float)  # Small 2-D fields, computed here
+        interpolator = VerticalInterpolator(reduced[0], target_levels(plevs, self.__press_inter))
+        other = 'lat' if dim == 'lon' else 'lon'
+        for name, d_arr_interp in zip(names, interpolator.apply(*reduced[1:])):
+            d_arr, conf = self.var_conf[name]
+            # Back to DataArray:
+            d_arr_interp = xr.DataArray(data=d_arr_interp,
+                                        dims=['plevs', other],
+                                        coords={'plevs': ('plevs', plevs),
+                                                other: (other, d_arr[other].values)},
+                                        attrs=d_arr.attrs)
+            self.var_conf[name] = (d_arr_interp, conf)
+
+    @dbg.capture()
+    def reduce_layer(self, top, bottom, operation='mean'):
+        """Reduces the added variables over the layer between the pressure levels top and bottom (values with
+        unit) on the hybrid levels: pressure weighted means (operation='mean') or column integrals
+        ('integral', divided by g). No interpolation to pressure levels is needed."""
+        bounds = layer_bounds(layer(top, bottom, operation), self.__press_inter)
+        self.select_levels(bounds, clip=True)
+        pascal = pascal_per_unit.get(self.__press_inter.attrs.get('units', 'hPa'), 100.)
+        names = list(self.var_conf.keys())
+        arrays = [self.var_conf[name][0] for name in names]
+        if self.__press_inter.chunks:  # Chunked backend: stays lazy, computed block by block when plotted
+            reduced = reduce_layer_blocks(self.__press_inter.data, [d_arr.data for d_arr in arrays], *bounds,
+                                          operation, pascal)
+        else:
+            integrator = LayerIntegrator(self.__press_inter, *bounds, pascal)
+            reduced = getattr(integrator, operation)(*arrays)
+        for name, d_arr, d_arr_reduced in zip(names, arrays, reduced):
+            attrs = dict(d_arr.attrs)
+            if operation == 'integral':
+                attrs['units'] = f"{d_arr.attrs.get('units', '1')} kg m-2"
+            # Back to DataArray:
+            self.var_conf[name] = (xr.DataArray(data=d_arr_reduced, dims=['lat', 'lon'],
+                                                coords={'lat': ('lat', d_arr['lat'].values),
+                                                        'lon': ('lon', d_arr['lon'].values)},
+                                                attrs=attrs), self.var_conf[name][1])
+
     def slice_to_area(self, area) -> None:
         """ Slices data to the given area.
         Slicing the data is necessary to calculate zonal means
         and makes other operations such as interpolating faster.
-        :param area: Dictionary defining a rectangle. Keys: ['right', 'left', 'top', 'bottom'], Values: Integer
+        :param area: Dictionary defining a rectangle. Keys: ['right', 'left', 'top', 'bottom'], Values: Degrees.
+                     Or a polygon (key 'polygon', WKT or GeoJSON), sliced to its bounding box
         :return: None
         """
 
-        #  We have to get the indices corresponding to the area (/user input)
-        if area['left'] < 0 and area['right'] >= 0:
-            lonslice = list(range(0, area['right']+1)) + list(range(area['left'] + 360, 361))
-        elif area['left'] < 0 and area['right'] < 0:
-            lonslice = slice(area['left']+360, area['right'] + 361)
-        else:
-            lonslice = slice(area['left'], area['right'] + 1)
-
-        lon_start = 180 - (area['top'] + 90)
-        lon_end = 180 - (area['bottom'] + 90)
-        latslice = slice(lon_start, lon_end + 1)
+        self.__press_inter = self.__select_area(self.__press_inter, area)
+        for name, (d_arr, conf) in list(self.var_conf.items()):
+            self.var_conf[name] = (self.__select_area(d_arr, area), conf)
 
-        self.__press_inter = self.__press_inter.isel({'lat': latslice, 'lon': lonslice})
+    def select_levels(self, levels, clip=False) -> None:
+        """Narrows PRESS and the added variables to the hybrid levels bracketing levels (magnitudes in the units of
+        PRESS), so only these hyperslabs are read. Only PRESS (within the sliced area) is read to find them.
+        :param clip: Clip levels to the pressure range first, for layer bounds outside of the columns
+        """
+        press = self.__press_inter if self.__press_inter.chunks else self.__press_inter.load()
+        values = np.asarray(press.values, dtype=float)
+        if clip:  # Bounds outside of the columns still need all levels up to the surface (or top)
+            levels = np.clip(levels, np.nanmin(values), np.nanmax(values))
+        selected = bracketing_levels(values, levels)
+        self.__press_inter = press
+        if selected is None:  # All levels are outside of the pressure range, the result is NaN anyway
+            return
+        vertical = press.dims[0]
+        self.__press_inter = press.isel({vertical: selected})
         for name, (d_arr, conf) in list(self.var_conf.items()):
-            d_arr_sliced = d_arr.isel({'lat': latslice, 'lon': lonslice})
-            self.var_conf[name] = (d_arr_sliced, conf)
+            self.var_conf[name] = (d_arr.isel({vertical: selected}), conf)
+
+    @staticmethod
+    def __select_area(obj, area):
+        """Selects the area (for polygons their bounding box) of a DataArray or Dataset.
+        Indices are looked up on the coordinates of the grid."""
+        grid = GridIndex.get(obj['lat'].values, obj['lon'].values)
+        if is_polygon(area):
+            return obj.isel(PolygonMask.get(grid, area['polygon']).indexers())
+        return grid.select(obj, area)
+
+    @staticmethod
+    def __add_cyclic_column(d_arr):
+        """Appends the first column at lon + 360 if the field covers all longitudes, so contours close
+        without a seam"""
+        lon = d_arr['lon'].values
+        if len(lon) < 2 or not np.isclose(lon[-1] - lon[0] + (lon[1] - lon[0]), 360):
+            return d_arr
+        first = d_arr.isel(lon=[0])
+        return xr.concat([d_arr, first.assign_coords(lon=first['lon'] + 360)], dim='lon')
 
-    def do_horizontal_plot(self, pressurelevels, level, area=None, fig='Plot'):
-        if area['left'] < 0 and area['right'] >= 0:
-            self.add_cyclic_points()
+    def do_horizontal_plot(self, plev, area=None, fig='Plot'):
+        """Plots the added variables at pressure level plev (a value, e.g. 500 hPa)"""
         self.slice_to_area(area)
-        self.interpolate(pressurelevels)
+        self.interpolate(plev)
         fig = plt.figure(num=fig)
         plt.clf()
         ax = plt.axes(projection=ccrs.PlateCarree()) if len(fig.axes) == 0 else fig.axes[0]
@@ -156,21 +286,21 @@ class SDModel:
             #ax.set_extent([-180, 180, -90, 90], crs=ccrs.PlateCarree())
             ax.set_extent([area['left'], area['right'], area['bottom'], area['top']], crs=ccrs.PlateCarree())
         for d_arr, conf in self.var_conf.values():
+            d_arr = self.__add_cyclic_column(d_arr)
             if conf.fill:
-                cf = ax.contourf(d_arr['lon'], d_arr['lat'], d_arr[level[0]], conf.grades, cmap=conf.cmap,
+                cf = ax.contourf(d_arr['lon'], d_arr['lat'], d_arr[0], conf.grades, cmap=conf.cmap,
                                  transform=ccrs.PlateCarree())
                 cb = fig.colorbar(cf, orientation='horizontal')
                 cb.set_label(d_arr.units, size='x-large')
             else:
-                ax.contour(d_arr['lon'], d_arr['lat'], d_arr[level[0]], conf.grades, cmap=conf.cmap,
+                ax.contour(d_arr['lon'], d_arr['lat'], d_arr[0], conf.grades, cmap=conf.cmap,
                            transform=ccrs.PlateCarree())
-        ax.set_title(f"{list(self.var_conf.keys())} at {level[1]}")
+        ax.set_title(f"{list(self.var_conf.keys())} at {plev}")
         ax.coastlines()
         ax.gridlines()
         plt.draw()
 
     def do_csec_plot(self, pressurelevels, start, end, x_ax_var='index', steps=100, fig='Plot'):
-        self.add_cyclic_points()
         self.interpolate_csec(pressurelevels, start, end, steps=steps)
         # x_ax_var = 'lon' if (abs(start['lon'] - end['lon']) > abs(start['lat'] - end['lat'])) else 'lat'  # Determines xaxis variable. (Let User decide?) lon/lat or index is possible
         fig = plt.figure(num=fig)
@@ -193,3 +323,74 @@ class SDModel:
         ax.set_title(
             f"Cross Section of {list(self.var_conf.keys())} from {(start['lat'], start['lon'])} to {(end['lat'], end['lon'])}")
         plt.draw()
+
+    def do_mean_section_plot(self, pressurelevels, dim='lon', area=None, fig='Plot'):
+        """Plots the mean of the added variables over dim ('lon': zonal mean, 'lat': meridional mean)
+        against pressure"""
+        self.interpolate_mean_section(pressurelevels, dim=dim, area=area)
+        x_ax_var = 'lat' if dim == 'lon' else 'lon'
+        fig = plt.figure(num=fig)
+        plt.clf()
+        ax = plt.axes() if len(fig.axes) == 0 else fig.axes[0]
+        for d_arr, conf in self.var_conf.values():
+            if conf.fill:
+                cf = ax.contourf(d_arr[x_ax_var], pressurelevels, d_arr, conf.grades, cmap=conf.cmap)
+                cb = fig.colorbar(cf, orientation='horizontal')
+                cb.set_label(d_arr.units, size='x-large')
+            else:
+                ax.contour(d_arr[x_ax_var], pressurelevels, d_arr, conf.grades, cmap=conf.cmap)
+        ax.set_yscale('symlog')
+        ax.set_ylim(pressurelevels.max(), pressurelevels.min())
+        ax.set_ylabel('Pressure (hPa)')
+        ax.set_xlabel(x_ax_var)
+        ax.set_yticks(np.arange(1000, 10, -100))
+        ax.set_yticklabels(np.arange(1000, 10, -100))
+        ax.set_title(f"{'Zonal' if dim == 'lon' else 'Meridional'} mean of {list(self.var_conf.keys())}")
+        plt.draw()
+
+    def do_profile_plot(self, pressurelevels, points: list, fig='Plot'):
+        """Plots vertical profiles of the added variables at the (lat, lon) points, one subplot per variable"""
+        self.interpolate_profiles(pressurelevels, points)
+        fig = plt.figure(num=fig)
+        plt.clf()
+        axes = fig.subplots(1, len(self.var_conf), sharey=True, squeeze=False)[0]
+        for ax, (name, (d_arr, conf)) in zip(axes, self.var_conf.items()):
+            for i in range(d_arr.sizes['point']):
+                ax.plot(d_arr[:, i], pressurelevels,
+                        label=f"({float(d_arr['lat'][i]):g}, {float(d_arr['lon'][i]):g})")
+            ax.set_xlabel(f"{name} ({d_arr.attrs.get('units', '')})")
+        axes[0].set_yscale('symlog')
+        axes[0].set_ylim(pressurelevels.max(), pressurelevels.min())
+        axes[0].set_ylabel('Pressure (hPa)')
+        axes[0].set_yticks(np.arange(1000, 10, -100))
+        axes[0].set_yticklabels(np.arange(1000, 10, -100))
+        if len(points) <= 10:  # A legend of hundreds of stations is not readable
+            axes[0].legend()
+        fig.suptitle(f"Vertical profiles of {list(self.var_conf.keys())} at {len(points)} points")
+        plt.draw()
+
+    def do_layer_plot(self, top, bottom, operation='mean', area=None, fig='Plot'):
+        """Plots the layer means or column integrals (see reduce_layer) of the added variables between
+        the pressure levels top and bottom"""
+        if area is not None:
+            self.slice_to_area(area)
+        self.reduce_layer(top, bottom, operation)
+        fig = plt.figure(num=fig)
+        plt.clf()
+        ax = plt.axes(projection=ccrs.PlateCarree()) if len(fig.axes) == 0 else fig.axes[0]
+        if area is not None:
+            ax.set_extent([area['left'], area['right'], area['bottom'], area['top']], crs=ccrs.PlateCarree())
+        for d_arr, conf in self.var_conf.values():
+            d_arr = self.__add_cyclic_column(d_arr)
+            if conf.fill:
+                cf = ax.contourf(d_arr['lon'], d_arr['lat'], d_arr, conf.grades, cmap=conf.cmap,
+                                 transform=ccrs.PlateCarree())
+                cb = fig.colorbar(cf, orientation='horizontal')
+                cb.set_label(d_arr.units, size='x-large')
+            else:
+                ax.contour(d_arr['lon'], d_arr['lat'], d_arr, conf.grades, cmap=conf.cmap,
+                           transform=ccrs.PlateCarree())
+        ax.set_title(f"Layer {operation} of {list(self.var_conf.keys())} from {top} to {bottom}")
+        ax.coastlines()
+        ax.gridlines()
+        plt.draw()
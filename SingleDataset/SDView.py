@@ -41,7 +41,10 @@ class SDView:
         plevels_selection = widgets.interactive(self.controller.set_plevs,
                                                 levels=widgets.Textarea(
                                                 value="1000, 800, 900, 700, 600, 500, 400, 300, 200, 100, 90, 80, 70, 60, 50, 40, 30, 20, 10"))
-        general_options = widgets.HBox([self.__plottype_selection, plevels_selection])
+        chunk_selection = widgets.interactive(self.controller.set_chunk_budget,
+                                              chunk_mb=widgets.BoundedIntText(value=0, min=0, max=65536,
+                                                                              description='Chunk MB:'))
+        general_options = widgets.HBox([self.__plottype_selection, plevels_selection, chunk_selection])
         self.__var_selection = widgets.Select(description='Select Variable:', options=['No Dataset opened'])
         self.__added_vars = widgets.Accordion([], layout=widgets.Layout(width='425px'))
         self.__add_btn = widgets.Button(description="Add Variable", disabled=True)
@@ -56,9 +59,19 @@ class SDView:
         csec_stepnum = widgets.interactive(self.controller.set_csec_steps, steps=(50, 300, 50))
         csec_all = widgets.VBox([csec_xvar, csec_stepnum, self.pointselection_out])
 
+        profile_points = widgets.interactive(self.controller.set_profile_points,
+                                             points=widgets.Textarea(placeholder='lat, lon; lat, lon; ...'))
+
         nonspecific_options = [general_options, var_configuration]
         self.__pointsel_options = nonspecific_options + [csec_all]
         self.__areasel_options = nonspecific_options + [hplot_all]
+        self.__profile_options = nonspecific_options + [profile_points]
+        layer_bounds = widgets.interactive(self.controller.set_layer,
+                                           top=widgets.BoundedFloatText(value=500, min=0.01, max=1100,
+                                                                        description='Top (hPa):'),
+                                           bottom=widgets.BoundedFloatText(value=850, min=0.01, max=1100,
+                                                                           description='Bottom (hPa):'))
+        self.__layer_options = self.__areasel_options + [layer_bounds]
 
         self.__options = widgets.Accordion(children=nonspecific_options)  # + [self.__initial_plottype])
         self.__options.set_title(0, 'Type of plot')
@@ -128,8 +141,18 @@ class SDView:
                 self.__options.children = self.__pointsel_options
                 self.__show_pointselection()
                 self.__options.set_title(2, f"{self.controller.get_plottypes()[0]} Options")
-            if change['new'] == self.controller.get_plottypes()[1]:
+            if change['new'] == self.controller.get_plottypes()[4]:
+                plt.close('Pointselection')
+                self.__options.children = self.__profile_options
+                self.__options.set_title(2, f"{change['new']} Options")
+            elif change['new'] in self.controller.get_plottypes()[5:]:
+                plt.close('Pointselection')
+                self.__options.children = self.__layer_options
+                self.areaSelection.show_again()
+                self.__options.set_title(2, f"{change['new']} Options")
+                self.__options.set_title(3, 'Layer')
+            elif change['new'] in self.controller.get_plottypes()[1:]:  # Horizontal and mean sections use the area
                 plt.close('Pointselection')
                 self.__options.children = self.__areasel_options
                 self.areaSelection.show_again()
-                self.__options.set_title(2, f"{self.controller.get_plottypes()[1]} Options")
+                self.__options.set_title(2, f"{change['new']} Options")
@@ -0,0 +1,89 @@
+import numpy as np
+
+try:
+    import dask.array as da
+except ImportError:  # Chunked backend is optional
+    da = None
+
+
+def target_levels(plevs, press) -> np.ndarray:
+    """Returns the magnitudes of the pressure levels in the units of the PRESS field"""
+    if hasattr(plevs, 'm_as'):
+        return np.atleast_1d(plevs.m_as(press.attrs.get('units', 'hPa'))).astype(float)
+    return np.atleast_1d(np.asarray(plevs, dtype=float))
+
+
+class VerticalInterpolator:
+    """Log-pressure interpolation along the first (vertical) axis.
+    Bracketing indices and weights are computed once for a pressure field and a list of target levels
+    and are then applied to any number of variables on the same grid.
+    Results follow the order of the target levels, targets outside of the pressure range become NaN
+    (same behaviour as metpy's log_interpolate_1d).
+    """
+
+    def __init__(self, press, levels):
+        xp = np.asarray(press, dtype=float)
+        self.levels = np.atleast_1d(np.asarray(levels, dtype=float))
+        nlev = xp.shape[0]
+        log_xp = np.log(xp)
+
+        # Sort the vertical axis only if the pressure is not increasing already (the usual case for hybrid levels)
+        sorter = None
+        if nlev > 1 and not np.all(log_xp[1:] >= log_xp[:-1]):
+            sorter = np.argsort(log_xp, axis=0)
+            log_xp = np.take_along_axis(log_xp, sorter, axis=0)
+
+        shape = (len(self.levels),) + xp.shape[1:]
+        above = np.empty(shape, dtype=np.intp)
+        for k, log_x in enumerate(np.log(self.levels)):
+            above[k] = np.count_nonzero(log_xp < log_x, axis=0)
+        np.clip(above, 1, max(nlev - 1, 1), out=above)
+        below = above - 1
+
+        log_above = np.take_along_axis(log_xp, above, axis=0)
+        log_below = np.take_along_axis(log_xp, below, axis=0)
+        log_x = np.log(self.levels).reshape((-1,) + (1,) * (xp.ndim - 1))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.weights = (log_x - log_below) / (log_above - log_below)
+        self.valid = (log_x >= log_below) & (log_x <= log_above) & np.isfinite(self.weights)
+
+        if sorter is not None:
+            above = np.take_along_axis(sorter, above, axis=0)
+            below = np.take_along_axis(sorter, below, axis=0)
+        self.above = above
+        self.below = below
+
+    def apply(self, *arrays) -> list:
+        """Interpolates all arrays (same shape as the pressure field) in one vectorized pass"""
+        stacked = np.stack([np.asarray(arr, dtype=float) for arr in arrays])
+        v_above = np.take_along_axis(stacked, self.above[np.newaxis], axis=1)
+        v_below = np.take_along_axis(stacked, self.below[np.newaxis], axis=1)
+        interp = v_below + (v_above - v_below) * self.weights[np.newaxis]
+        interp[:, ~self.valid] = np.nan
+        return list(interp)
+
+
+def bracketing_levels(press, levels):
+    """Slice of the vertical axis containing all levels needed to interpolate press to levels.
+    None if all levels are outside of the pressure range."""
+    interpolator = VerticalInterpolator(press, levels)
+    needed = np.concatenate([interpolator.below[interpolator.valid], interpolator.above[interpolator.valid]])
+    if needed.size == 0:
+        return None
+    return slice(int(needed.min()), int(needed.max()) + 1)
+
+
+def interpolate_blocks(press, arrays, levels) -> list:
+    """Lazy, blockwise version of VerticalInterpolator(press, levels).apply(*arrays) for dask arrays
+    that are chunked horizontally only. Every block is interpolated on its own when computed,
+    so memory is bound by the chunk size and not by the size of the field."""
+    levels = np.atleast_1d(np.asarray(levels, dtype=float))
+    press = da.asarray(press).rechunk({0: -1})
+    stacked = da.stack([da.asarray(arr).rechunk(press.chunks) for arr in arrays]).rechunk({0: -1})
+
+    def interpolate_block(stacked_block, press_block):
+        return np.stack(VerticalInterpolator(press_block[0], levels).apply(*stacked_block))
+
+    interpolated = da.map_blocks(interpolate_block, stacked, press[np.newaxis], dtype=float,
+                                 chunks=((len(arrays),), (len(levels),)) + press.chunks[1:])
+    return [interpolated[i] for i in range(len(arrays))]
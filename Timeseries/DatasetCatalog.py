@@ -0,0 +1,100 @@
+import hashlib
+import os
+import re
+from datetime import datetime, timedelta
+
+from Timeseries.DatasetFile import file_prefix, file_suffix
+from Timeseries.ResultCache import create_cache_dir, default_cache_dir, open_database
+
+filename_pattern = re.compile(re.escape(file_prefix) + r'\d{4}(\d{2})(\d{2})' + re.escape(file_suffix) + '$')
+epoch = datetime(1970, 1, 1)
+
+
+def to_seconds(date: datetime) -> int:
+    return int((date - epoch).total_seconds())
+
+
+def from_seconds(seconds: int) -> datetime:
+    return epoch + timedelta(seconds=seconds)
+
+
+class DatasetCatalog:
+    """Index of the 'YYYY/MM/ecmwf_era5_YYMMDDHH.nc' archive below root_dir, stored in a SQLite database.
+    The archive is scanned with bulk directory listings. Refreshing only rescans month directories
+    whose mtime changed since the last scan, range queries are index lookups on the date column.
+    """
+
+    def __init__(self, root_dir: str, cache_dir: str = None):
+        self.root_dir = root_dir
+        cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        create_cache_dir(cache_dir)
+        root_hash = hashlib.sha256(os.path.realpath(root_dir).encode()).hexdigest()[:16]
+        self.db_path = os.path.join(cache_dir, f'catalog_{root_hash}.sqlite')
+        with open_database(self.db_path) as con:
+            # Dates are stored as seconds since 1970-01-01
+            con.execute('CREATE TABLE IF NOT EXISTS files '
+                        '(date INTEGER PRIMARY KEY, month TEXT, path TEXT, size INTEGER, mtime INTEGER)')
+            con.execute('CREATE INDEX IF NOT EXISTS files_month ON files (month)')
+            con.execute('CREATE TABLE IF NOT EXISTS months (month TEXT PRIMARY KEY, mtime INTEGER)')
+
+    def refresh(self, date_start: datetime = None, date_end: datetime = None):
+        """Rescans all month directories (within the given interval) that changed since the last refresh"""
+        month_start = (date_start.year, date_start.month) if date_start is not None else (0, 0)
+        month_end = (date_end.year, date_end.month) if date_end is not None else (9999, 12)
+        found = dict()  # 'YYYY/MM' -> (directory path, mtime)
+        for year_entry in self.__scan(self.root_dir):
+            if not (len(year_entry.name) == 4 and year_entry.name.isdigit() and year_entry.is_dir()):
+                continue
+            for month_entry in self.__scan(year_entry.path):
+                if not (len(month_entry.name) == 2 and month_entry.name.isdigit() and month_entry.is_dir()):
+                    continue
+                if month_start <= (int(year_entry.name), int(month_entry.name)) <= month_end:
+                    month = year_entry.name + '/' + month_entry.name
+                    found[month] = (month_entry.path, month_entry.stat().st_mtime_ns)
+
+        with open_database(self.db_path) as con:
+            known = dict(con.execute('SELECT month, mtime FROM months').fetchall())
+            for month, mtime in known.items():
+                year, month_number = (int(part) for part in month.split('/'))
+                if month not in found and month_start <= (year, month_number) <= month_end:
+                    con.execute('DELETE FROM files WHERE month = ?', (month,))
+                    con.execute('DELETE FROM months WHERE month = ?', (month,))
+            for month, (directory, mtime) in found.items():
+                if known.get(month) != mtime:
+                    rows = self.__scan_month(month, directory)
+                    con.execute('DELETE FROM files WHERE month = ?', (month,))
+                    con.executemany('INSERT OR REPLACE INTO files (date, month, path, size, mtime) '
+                                    'VALUES (?, ?, ?, ?, ?)', rows)
+                    con.execute('INSERT OR REPLACE INTO months (month, mtime) VALUES (?, ?)', (month, mtime))
+
+    def query(self, date_start: datetime, date_end: datetime) -> list:
+        """Returns sorted list of (date, path) of all indexed files between start and end (inclusive)"""
+        with open_database(self.db_path) as con:
+            rows = con.execute('SELECT date, path FROM files WHERE date BETWEEN ? AND ? ORDER BY date',
+                               (to_seconds(date_start), to_seconds(date_end))).fetchall()
+        return [(from_seconds(seconds), filepath) for seconds, filepath in rows]
+
+    @staticmethod
+    def __scan(directory: str) -> list:
+        try:
+            with os.scandir(directory) as entries:
+                return list(entries)
+        except OSError:
+            return []
+
+    def __scan_month(self, month: str, directory: str) -> list:
+        """Rows for all dataset files of one month directory. Year and month are taken from the directories,
+        day and hour from the filename (like DatasetFile does)."""
+        year, month_number = (int(part) for part in month.split('/'))
+        rows = []
+        for entry in self.__scan(directory):
+            match = filename_pattern.match(entry.name)
+            if match is None:
+                continue
+            try:
+                date = datetime(year, month_number, int(match.group(1)), int(match.group(2)))
+                stat = entry.stat()
+            except (ValueError, OSError):
+                continue
+            rows.append((to_seconds(date), month, entry.path, stat.st_size, stat.st_mtime_ns))
+        return rows
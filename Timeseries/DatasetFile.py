@@ -1,34 +1,37 @@
+import re
 from datetime import datetime
 from pandas import Timestamp
 from os import path
-from typing import List
+from typing import Tuple
 
 file_prefix = 'ecmwf_era5_'
 file_suffix = '.nc'
 
+date_path_pattern = re.compile(r'(?:^|[/\\])(\d{4})[/\\](\d{2})[/\\]' + re.escape(file_prefix) + r'\d{4}(\d{2})(\d{2})'
+                               + re.escape(file_suffix) + '$')
+
 
 class DatasetFile:
+    """Single dataset file. Only root directory and date are stored, filename and path are derived on demand.
+    Large selections are handled by DatasetFileCollection."""
+    __slots__ = ('root', 'date', 'display_format')
+    display_formats: Tuple[str, ...] = ('filename', 'date', 'path')
 
     def __init__(self, root_dir: path = '', param=None):
         self.root: path = root_dir
+        self.display_format = self.display_formats[0]
         if isinstance(param, Timestamp):
-            date: Timestamp = param
-            self.date: datetime = date.to_pydatetime()
-            self.filename: str = self.date_to_filename(date=date)
-            self.filepath: path = self.date_to_filepath(date=date)
-        elif isinstance(param, path):
-            filepath: path = param
-            self.filename = self.path_to_filename(filepath=filepath)
-            self.date = self.path_to_date(filepath=filepath)
-            self.filepath = filepath
+            self.date: datetime = param.to_pydatetime()
+        elif isinstance(param, datetime):
+            self.date = param
+        elif isinstance(param, str):
+            self.date = self.path_to_date(filepath=param)
+            if not self.root:  # root is the directory above YYYY/MM
+                self.root = path.dirname(path.dirname(path.dirname(param)))
         else:
             self.date = None
-            self.filepath = None
-            self.filename = None
             # TODO -> print statement as debug
-            print(str(param) + ' is not of type ' + str(type(datetime)) + ' or ' + str(type(path)))
-        self.display_formats: List[str] = ['filename', 'date', 'path']
-        self.display_format = self.display_formats[0]
+            print(str(param) + ' is not of type ' + str(datetime) + ' or ' + str(str))
 
     def set_display_format(self, display_format: str):
         """Sets display format of string representation. Formats are: 'filename', 'date' and 'path'"""
@@ -38,59 +41,16 @@ class DatasetFile:
 
     def date_to_filename(self, date: datetime) -> str:
         """Converts a date into a filename"""
-        year = f"{date.year % 100:02d}"
-        month = f"{date.month:02d}"
-        return file_prefix + year + month + f"{date.day:02d}" + f"{date.hour:02d}" + file_suffix
+        return f"{file_prefix}{date.year % 100:02d}{date.month:02d}{date.day:02d}{date.hour:02d}{file_suffix}"
 
     def path_to_date(self, filepath: path) -> datetime:
-        """Converts a path into a date"""
-        filename = self.path_to_filename(filepath)
-        if filename.startswith(file_prefix) and filename.endswith(file_suffix):  # check if filename syntax is correct
-            filename = filename[len(file_prefix):-len(file_suffix)]
-
-            # day and hour from filename
-            # month = int(filename[2:4])
-            day = int(filename[4:6])
-            hour = int(filename[6:8])
-
-            # month and year from path to file
-            # split path to file into directories
-            directories = []
-            while 1:
-                filename, directory_name = path.split(filepath)
-
-                if directory_name != "":
-                    directories.append(directory_name)
-                elif path != "":
-                    directories.append(filename)
-                    break
-
-            # obtain by directory_name length
-            year = None
-            month = None
-            for directory_name in directories:
-                # print(directory_name)
-                if month is None and len(directory_name) == 2:
-                    try:
-                        month = int(directory_name)
-                    except ValueError:
-                        pass
-                elif year is None and len(directory_name) == 4:
-                    try:
-                        year = int(directory_name)
-                    except ValueError:
-                        pass
-                elif year is not None and month is not None:
-                    return datetime(year=year, month=month, day=day, hour=hour)
-
-            # obtain by two directories previous to filename
-            # try:
-            #     month = int(directories[0])
-            #     year = int(directories[1])
-            # except ValueError:
-            #     pass  # ignore and raise SyntaxError
-
-        raise SyntaxError("Syntax of '" + filename + "' is incorrect")
+        """Converts a path of the form '.../YYYY/MM/ecmwf_era5_YYMMDDHH.nc' into a date.
+        Year and month are taken from the directories, day and hour from the filename."""
+        match = date_path_pattern.search(filepath)
+        if match is None:
+            raise SyntaxError("Syntax of '" + self.path_to_filename(filepath) + "' is incorrect")
+        year, month, day, hour = (int(group) for group in match.groups())
+        return datetime(year=year, month=month, day=day, hour=hour)
 
     def get_date(self) -> datetime:
         return self.date
@@ -114,16 +74,13 @@ class DatasetFile:
 
     def date_to_filepath(self, date: datetime) -> path:
         """Converts date to path"""
-        filename = self.date_to_filename(date=date)
-        year = f"{date.year:04d}"
-        month = f"{date.month:02d}"
-        return path.join(self.root, year, month, filename)
+        return path.join(self.root, f"{date.year:04d}", f"{date.month:02d}", self.date_to_filename(date=date))
 
     def get_filename(self) -> str:
-        return self.filename
+        return self.date_to_filename(self.date) if self.date is not None else None
 
     def get_filepath(self) -> path:
-        return self.filepath
+        return self.date_to_filepath(self.date) if self.date is not None else None
 
     def exists(self) -> bool:
         """Checks if DatasetFile exists"""
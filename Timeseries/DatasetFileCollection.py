@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from os import path
+
+from Timeseries.DatasetFile import DatasetFile, file_prefix, file_suffix
+
+display_formats = ['filename', 'date', 'path']
+filename_format = file_prefix + '%y%m%d%H' + file_suffix
+
+
+class DatasetFileCollection:
+    """Array backed collection of dataset files.
+    Only the dates are stored (as a datetime64 array). Filenames, paths and display strings are derived on demand
+    and vectorized, optionally only for a slice of the collection (e.g. the entries that are currently shown).
+    """
+
+    def __init__(self, root_dir: path = '', dates=None):
+        self.root: path = root_dir
+        self.dates: np.ndarray = np.asarray(dates if dates is not None else [], dtype='datetime64[s]')
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def __getitem__(self, index):
+        """Integer index returns a DatasetFile, slices, index arrays and boolean masks return a collection"""
+        if isinstance(index, (int, np.integer)):
+            return DatasetFile(root_dir=self.root, param=pd.Timestamp(self.dates[index]))
+        return DatasetFileCollection(root_dir=self.root, dates=self.dates[index])
+
+    def sorted(self) -> 'DatasetFileCollection':
+        if len(self.dates) < 2 or np.all(self.dates[1:] >= self.dates[:-1]):
+            return self
+        return DatasetFileCollection(root_dir=self.root, dates=np.sort(self.dates))
+
+    def get_dates(self, start: int = None, stop: int = None) -> list:
+        return self.dates[start:stop].astype(datetime).tolist()
+
+    def filenames(self, start: int = None, stop: int = None) -> np.ndarray:
+        return self.__strftime(filename_format, start, stop)
+
+    def filepaths(self, start: int = None, stop: int = None) -> np.ndarray:
+        root = str(self.root).replace('%', '%%')
+        return self.__strftime(path.join(root, '%Y', '%m', filename_format), start, stop)
+
+    def format(self, display_format: str, start: int = None, stop: int = None) -> list:
+        """String representations of the entries between start and stop.
+        Formats are: 'filename', 'date' and 'path' (like DatasetFile)"""
+        display_format = display_format.lower()
+        if display_format == display_formats[1]:
+            return list(self.__strftime('%Y-%m-%d %H:%M:%S', start, stop))
+        elif display_format == display_formats[2]:
+            return list(self.filepaths(start, stop))
+        return list(self.filenames(start, stop))
+
+    def exists(self) -> np.ndarray:
+        """Boolean mask of the files that exist. Needs one stat call per file."""
+        return np.array([path.isfile(filepath) for filepath in self.filepaths()], dtype=bool)
+
+    def __strftime(self, date_format: str, start: int, stop: int) -> np.ndarray:
+        return np.asarray(pd.DatetimeIndex(self.dates[start:stop]).strftime(date_format), dtype=object)
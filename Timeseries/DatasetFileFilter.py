@@ -1,13 +1,14 @@
-from Timeseries.DatasetFile import DatasetFile
+import numpy as np
 
 
 class DatasetFileFilter:
+    """Applied filter. The mask marks the collected datasets removed by this filter."""
 
-    def __init__(self, description: str = '', filtered_datasets=None):
-        if filtered_datasets is None:
-            filtered_datasets = []
+    def __init__(self, description: str = '', mask: np.ndarray = None):
+        if mask is None:
+            mask = np.zeros(0, dtype=bool)
         self.description = description
-        self.filtered_datasets = filtered_datasets
+        self.mask = mask
 
     def get_name(self):
         return self.description
@@ -15,5 +16,5 @@ class DatasetFileFilter:
     def __str__(self):
         return self.description
 
-    def get_datasets(self):
-        return self.filtered_datasets
+    def get_mask(self) -> np.ndarray:
+        return self.mask
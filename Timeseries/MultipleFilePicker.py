@@ -1,4 +1,4 @@
-import re
+import sqlite3
 from pathlib import Path
 
 import ipywidgets as widgets
@@ -9,10 +9,13 @@ import pandas as pd
 from typing import List
 
 from Interfaces.FilePickerInterface import FilePickerInterface
-from Timeseries.DatasetFile import DatasetFile
+from Timeseries.DatasetCatalog import DatasetCatalog
+from Timeseries.DatasetFileCollection import DatasetFileCollection
 from Timeseries.DatasetFileFilter import DatasetFileFilter
+import numpy as np
 
 style = {'description_width': 'initial'}
+page_size = 1000  # Number of datasets shown at once in the selection widget
 
 
 class MultipleFilePicker(FilePickerInterface):
@@ -21,6 +24,10 @@ class MultipleFilePicker(FilePickerInterface):
         self.root_dir: path = root_dir
         if self.root_dir is None:
             self.root_dir = path.join(path.sep, 'p', 'fastdata', 'slmet', 'slmet111', 'met_data', 'ecmwf', 'era5', 'nc')
+        try:
+            self.catalog: DatasetCatalog = DatasetCatalog(self.root_dir)
+        except (OSError, sqlite3.Error):
+            self.catalog = None
 
         # filers and filter (multiple selection widget)
         self.dataset_files_selection: widgets.SelectMultiple = widgets.SelectMultiple()
@@ -28,10 +35,18 @@ class MultipleFilePicker(FilePickerInterface):
         self.filter_specification_box: FilterBox = FilterBox()
         self.filter_specification: widgets.Box = widgets.Box([])
 
-        self.datasets: List[DatasetFile] = []
+        # All collected datasets (sorted). Filters and manual removals are boolean masks over this table,
+        # 'datasets' holds the remaining (visible) datasets.
+        self.collected: DatasetFileCollection = DatasetFileCollection(root_dir=self.root_dir)
+        self.removed_mask: np.ndarray = np.zeros(0, dtype=bool)
+        self.visible_mask: np.ndarray = np.zeros(0, dtype=bool)
+        self.datasets: DatasetFileCollection = self.collected
         self.dataset_filters: List[DatasetFileFilter] = []
+        self.display_format: str = 'filename'
+        self.page_selection: widgets.BoundedIntText = widgets.BoundedIntText(value=1, min=1, max=1,
+                                                                             description='Page:', style=style)
 
-        self.recently_removed_datasets: List[List[DatasetFile]] = [[]]
+        self.recently_removed_datasets: List[np.ndarray] = []  # indices into collected
 
         self.datebox_main: DateSelector = DateSelector()
 
@@ -45,7 +60,6 @@ class MultipleFilePicker(FilePickerInterface):
                                                         )
 
         def button_collect_clicked(collect_button: widgets.Button):
-            self.datasets = []
             # check if dates are valid
             if self.datebox_main.evaluate_dates():
                 # collect available datasets from specified start and end datetime objects
@@ -78,16 +92,22 @@ class MultipleFilePicker(FilePickerInterface):
         Returns: True if datasets were found, False otherwise"""
         # print('Collecting datasets between ' + str(date_start) + " and " + str(date_end))
 
-        dates_between: pd.DatetimeIndex = pd.date_range(date_start, date_end, freq='h')
-        for date_elem in dates_between:
-            dataset_file: DatasetFile = DatasetFile(root_dir=self.root_dir, param=date_elem)
-            # print(dataset_file)
-
-            if dataset_file.exists():
-                self.datasets.append(dataset_file)
-            # else:
-            #     print("File '" + path.join(self.root_dir, dataset_file.get_filepath()) + "' does not exist")
-        return bool(self.datasets)  # return whether name-path map is empty
+        if self.catalog is not None:
+            self.catalog.refresh(date_start=date_start, date_end=date_end)
+            dates = [date for date, filepath in self.catalog.query(date_start=date_start, date_end=date_end)]
+            collected = DatasetFileCollection(root_dir=self.root_dir, dates=dates)
+        else:
+            # Fallback without catalog: check every hour in the interval
+            dates_between: pd.DatetimeIndex = pd.date_range(date_start, date_end, freq='h')
+            candidates = DatasetFileCollection(root_dir=self.root_dir, dates=dates_between.values)
+            collected = candidates[candidates.exists()]
+
+        self.collected = collected.sorted()
+        self.removed_mask = np.zeros(len(self.collected), dtype=bool)
+        self.recently_removed_datasets = []
+        self.dataset_filters = []
+        self.update_mask()
+        return bool(len(self.collected))  # return whether any dataset was found
 
     def init_dataset_specification(self):
         """initialize widgets for display and filtering of selected files (filtering)"""
@@ -116,10 +136,7 @@ class MultipleFilePicker(FilePickerInterface):
 
         def dataset_format_change(change):
             """Sets display format of dataset files"""
-            display_format = change['new']
-            # print(display_format)
-            for dataset in self.datasets:
-                dataset.set_display_format(display_format)
+            self.display_format = change['new'].lower()
             self.update_selected_dataset_files()
 
         dataset_display_format.observe(dataset_format_change, names=['value'])
@@ -137,8 +154,8 @@ class MultipleFilePicker(FilePickerInterface):
             """Populates datasets with recently removed sets. (Manually removed datasets only. Filters are treated separately.)"""
             # print('undoing recent changes')
             if self.recently_removed_datasets:
-                recently_removed: list = self.recently_removed_datasets.pop()
-                self.datasets.extend(recently_removed)
+                self.removed_mask[self.recently_removed_datasets.pop()] = False
+                self.update_mask()
                 self.update_selected_dataset_files()
 
         undo_button.on_click(undo_button_clicked)
@@ -153,15 +170,18 @@ class MultipleFilePicker(FilePickerInterface):
                                                                       )
 
         def remove_selected_files_button_clicked(button_remove: widgets.Button):
-            self.remove_datasets(datasets_to_remove=self.dataset_files_selection.value)
+            page_start = (self.page_selection.value - 1) * page_size
+            self.remove_datasets(indices=[page_start + index for index in self.dataset_files_selection.index])
 
         remove_selected_files_button.on_click(remove_selected_files_button_clicked)
 
         dataset_buttons_box: widgets.VBox = widgets.VBox([undo_button, remove_selected_files_button])
 
+        self.page_selection.observe(lambda change: self.update_selected_dataset_files(), names=['value'])
+
         dataset_selection_box: widgets.HBox = widgets.HBox([self.dataset_files_selection, dataset_buttons_box])
 
-        dataset_box: widgets.VBox = widgets.VBox([dataset_display_format, dataset_selection_box])
+        dataset_box: widgets.VBox = widgets.VBox([dataset_display_format, dataset_selection_box, self.page_selection])
 
         # filter
 
@@ -206,15 +226,15 @@ class MultipleFilePicker(FilePickerInterface):
                                                                      )
 
                 def apply_filter_button_clicked(button_apply: widgets.Button):
-                    new_dataset_files: List[DatasetFile] = self.filter_specification_box.filter(datasets=self.datasets)
-                    filtered_files = [dataset for dataset in self.datasets if dataset not in new_dataset_files]
-                    if len(filtered_files) != 0:
+                    mask: np.ndarray = self.filter_specification_box.mask(datasets=self.collected,
+                                                                          active=self.visible_mask)
+                    if mask.any():
                         self.dataset_filters.append(DatasetFileFilter(
-                            filtered_datasets=filtered_files,
+                            mask=mask,
                             description=self.filter_specification_box.get_description()))
                         self.update_selected_filters()
 
-                        self.datasets = new_dataset_files
+                        self.update_mask()
                         self.update_selected_dataset_files()
 
                         self.filter_specification.layout.display = 'none'
@@ -265,20 +285,14 @@ class MultipleFilePicker(FilePickerInterface):
                                                        )
 
         def remove_selected_filter_button_clicked(button_remove: widgets.Button):
-            filter_descriptions: List[str] = self.filter_selection.value
-            filters_to_to_remove: List[DatasetFileFilter] = []
-            for filter_description in filter_descriptions:
-                for dataset_filter in self.dataset_filters:
-                    if str(dataset_filter) == filter_description:
-                        filters_to_to_remove.append(dataset_filter)
-            for dataset_filter in filters_to_to_remove:
-                self.datasets.extend(dataset_filter.get_datasets())
-            self.update_selected_dataset_files()
-
-            self.dataset_filters = [dataset_filter for dataset_filter in self.dataset_filters if
-                                    dataset_filter not in filters_to_to_remove]
+            selected = set(self.filter_selection.index)
+            self.dataset_filters = [dataset_filter for i, dataset_filter in enumerate(self.dataset_filters)
+                                    if i not in selected]
             self.update_selected_filters()
 
+            self.update_mask()
+            self.update_selected_dataset_files()
+
         remove_selected_filter_button.on_click(remove_selected_filter_button_clicked)
 
         filter_buttons_box: widgets.VBox = widgets.VBox([create_filter_button, remove_selected_filter_button])
@@ -322,12 +336,24 @@ class MultipleFilePicker(FilePickerInterface):
         self.main_component.set_title(1, 'Dataset Filtering')
         self.main_component.selected_index = 1
 
-    def update_selected_dataset_files(self):  # [DatasetFile]
-        """Sorts datasets and populates MultipleSelection with their names"""
+    def update_mask(self):
+        """Recomputes the remaining datasets from the manual removals and the masks of all filters"""
+        filtered = self.removed_mask.copy()
+        for dataset_filter in self.dataset_filters:
+            filtered |= dataset_filter.get_mask()
+        self.visible_mask = ~filtered
+        self.datasets = self.collected[self.visible_mask]
+
+    def update_selected_dataset_files(self):
+        """Populates MultipleSelection with the names of the current page"""
         # print('updating dataset list')
 
-        self.datasets = sorted(self.datasets, key=lambda file: file.date)
-        self.dataset_files_selection.options = [str(dataset) for dataset in self.datasets]
+        pages = max(1, -(-len(self.datasets) // page_size))
+        self.page_selection.max = pages
+        self.page_selection.layout.display = 'none' if pages == 1 else 'flex'
+        page_start = (min(self.page_selection.value, pages) - 1) * page_size
+        self.dataset_files_selection.options = self.datasets.format(self.display_format, page_start,
+                                                                    page_start + page_size)
         self.dataset_files_selection.style = style
 
     def update_selected_filters(self):
@@ -340,27 +366,24 @@ class MultipleFilePicker(FilePickerInterface):
         self.filter_selection.options = [str(dataset_filter) for dataset_filter in self.dataset_filters]
         self.filter_selection.style = style
 
-    def remove_datasets(self, datasets_to_remove: list = None):
-        """Removes datasets from MultipleSelection. Appends removed datasets to another list, so they can be recalled."""
+    def remove_datasets(self, indices: list = None):
+        """Removes datasets at the given positions from MultipleSelection. Appends removed datasets to another list, so they can be recalled."""
         # print('removing datasets')
-        if datasets_to_remove is not None:
-            removed_datasets = []
-            for dataset_attr in datasets_to_remove:
-                for dataset in self.datasets:
-                    if str(dataset_attr) == str(dataset):
-                        removed_datasets.append(dataset)
-            self.datasets = [dataset for dataset in self.datasets if dataset not in removed_datasets]
-            self.recently_removed_datasets.append(removed_datasets)
+        if indices:
+            removed = np.flatnonzero(self.visible_mask)[list(indices)]
+            self.removed_mask[removed] = True
+            self.recently_removed_datasets.append(removed)
+            self.update_mask()
             self.update_selected_dataset_files()
 
     def get_widget(self) -> widgets:
         return self.main_component
 
     def get_file_paths(self) -> list:
-        return [str(dataset.get_filepath()) for dataset in self.datasets]
+        return list(self.datasets.filepaths())
 
     def get_file_dates(self) -> list:
-        return [dataset.get_date() for dataset in self.datasets]
+        return self.datasets.get_dates()
 
 
 def notify(text: str):
@@ -459,8 +482,9 @@ class FilterBox(widgets.Box):
     def get_description(self) -> str:
         return 'Base Filter'
 
-    def filter(self, datasets: List[DatasetFile]) -> List[DatasetFile]:
-        return datasets
+    def mask(self, datasets: DatasetFileCollection, active: np.ndarray) -> np.ndarray:
+        """Returns boolean mask of the datasets removed by this filter. Only active datasets are considered."""
+        return np.zeros(len(datasets), dtype=bool)
 
 
 class FrequencyFilterBox(FilterBox):
@@ -492,7 +516,7 @@ class FrequencyFilterBox(FilterBox):
     def get_description(self) -> str:
         return 'Every ' + str(self.frequency_selection.value) + ' (' + str(FrequencyFilterBox.ID) + ')'
 
-    def filter(self, datasets: List[DatasetFile]) -> List[DatasetFile]:
+    def mask(self, datasets: DatasetFileCollection, active: np.ndarray) -> np.ndarray:
         timescale = self.frequency_selection.value
         frequency: int = 1
         if timescale == self.frequency_options[0]:
@@ -501,10 +525,11 @@ class FrequencyFilterBox(FilterBox):
             frequency = 3
         elif timescale == self.frequency_options[2]:
             frequency = 5
-        filtered_datasets = [dataset for dataset in datasets if dataset not in datasets[frequency - 1::frequency]]
-        if len(filtered_datasets) != len(datasets):
+        mask = np.zeros(len(datasets), dtype=bool)
+        mask[np.flatnonzero(active)[frequency - 1::frequency]] = True
+        if mask.any():
             FrequencyFilterBox.ID += 1
-        return filtered_datasets
+        return mask
 
 
 class IntervalFilterBox(FilterBox):
@@ -520,16 +545,12 @@ class IntervalFilterBox(FilterBox):
         return 'From ' + str(self.interval_selection.get_start_date()) + ' until ' + str(
             self.interval_selection.get_end_date())
 
-    def filter(self, datasets: List[DatasetFile]) -> List[DatasetFile]:
+    def mask(self, datasets: DatasetFileCollection, active: np.ndarray) -> np.ndarray:
         if self.interval_selection.evaluate_dates():
-            start_date = self.interval_selection.get_start_date()
-            end_date = self.interval_selection.get_end_date()
-            filtered_datasets = []
-            for dataset in datasets:
-                if not start_date <= dataset.get_date() <= end_date:
-                    filtered_datasets.append(dataset)
-            return filtered_datasets
-        return datasets
+            start_date = np.datetime64(self.interval_selection.get_start_date(), 's')
+            end_date = np.datetime64(self.interval_selection.get_end_date(), 's')
+            return active & (start_date <= datasets.dates) & (datasets.dates <= end_date)
+        return np.zeros(len(datasets), dtype=bool)
 
 
 class RegexFilterBox(FilterBox):
@@ -579,12 +600,8 @@ class RegexFilterBox(FilterBox):
     def get_description(self) -> str:
         return str(self.regex_selection.value)
 
-    def filter(self, datasets: List[DatasetFile]) -> List[DatasetFile]:
-        pattern = re.compile(self.regex_selection.value)
-        filtered_datasets = []
-        for dataset in datasets:
-            dataset.set_display_format(self.format_selection.value)
-            matches: bool = bool(re.match(pattern=pattern, string=str(dataset)))
-            if not matches:
-                filtered_datasets.append(dataset)
-        return filtered_datasets
+    def mask(self, datasets: DatasetFileCollection, active: np.ndarray) -> np.ndarray:
+        labels = pd.Series(datasets[active].format(self.format_selection.value), dtype=object)
+        mask = np.zeros(len(datasets), dtype=bool)
+        mask[active] = labels.str.match(self.regex_selection.value).values.astype(bool)
+        return mask
@@ -0,0 +1,38 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class Prefetcher:
+    """Loads the files following the current one in background threads, so reading file N+1 overlaps with
+    the computation on file N. At most depth files are read ahead. After the first file, the read-ahead is
+    reduced further so that the loaded files fit into memory_budget (bytes)."""
+
+    def __init__(self, load, paths: list, depth: int = 4, memory_budget: int = 2 * 1024 ** 3):
+        """:param load: Function path -> loaded object. The object should provide nbytes for the memory budget."""
+        self.load = load
+        self.paths = paths
+        self.depth = max(1, depth)
+        self.memory_budget = memory_budget
+
+    def __iter__(self):
+        """Yields (path, loaded object, exception) in the order of the paths. Either object or exception is None."""
+        pending = deque()
+        read_ahead = self.depth
+        next_index = 0
+        with ThreadPoolExecutor(max_workers=self.depth) as pool:
+            while next_index < len(self.paths) or pending:
+                while next_index < len(self.paths) and len(pending) < read_ahead:
+                    path = self.paths[next_index]
+                    pending.append((path, pool.submit(self.load, path)))
+                    next_index += 1
+                path, future = pending.popleft()
+                try:
+                    loaded, error = future.result(), None
+                except Exception as e:
+                    loaded, error = None, e
+                if loaded is not None and hasattr(loaded, 'nbytes'):
+                    # One file is being processed while the others are read ahead
+                    nbytes = loaded.nbytes() if callable(loaded.nbytes) else loaded.nbytes  # xarray: property
+                    files_in_budget = self.memory_budget // max(nbytes, 1) - 1
+                    read_ahead = max(1, min(self.depth, files_in_budget))
+                yield path, loaded, error
@@ -0,0 +1,80 @@
+import numpy as np
+
+from SingleDataset.GridIndex import GridIndex
+from SingleDataset.PolygonMask import PolygonMask, is_polygon
+
+
+class RegionWeights:
+    """Sparse weights of named regions on a grid, used to reduce all regions from a single read of a file.
+    Only the rows and columns covered by at least one region are read. Every region keeps the flat indices of
+    its covered cells within these grid points and their weights (1, optionally scaled by cos(latitude) for area
+    weighting), so its means are a NaN-aware weighted sum over the gathered cells only.
+    """
+
+    def __init__(self, grid: GridIndex, regions: dict, coslat: bool = False):
+        """:param regions: Maps name to area, a rectangle (dictionary with keys ['right', 'left', 'top', 'bottom'])
+                        or a polygon (dictionary with key 'polygon': WKT or GeoJSON)"""
+        self.names = list(regions.keys())
+        covered = [self.__covered_cells(grid, area) for area in regions.values()]
+        rows = np.concatenate([cell_rows for cell_rows, cell_columns in covered])
+        columns = np.unique(np.concatenate([cell_columns for cell_rows, cell_columns in covered]))
+        if rows.size == 0:
+            raise Exception(f"Regions {self.names} contain no grid points")
+        self.rows = slice(int(rows.min()), int(rows.max()) + 1)
+        # Contiguous columns are read as one hyperslab, otherwise only the needed columns
+        contiguous = columns[-1] - columns[0] + 1 == len(columns)
+        self.columns = slice(int(columns[0]), int(columns[-1]) + 1) if contiguous else columns
+        self.shape = (self.rows.stop - self.rows.start, len(columns))  # (rows, columns) of the needed grid points
+
+        self.cells = []  # Per region: (rows, columns) within the needed grid points, flat indices and weights
+        for cell_rows, cell_columns in covered:
+            local_rows = cell_rows - self.rows.start
+            local_columns = np.searchsorted(columns, cell_columns)
+            weights = np.cos(np.deg2rad(grid.lat[cell_rows])) if coslat else np.ones(len(cell_rows))
+            self.cells.append((local_rows, local_columns, local_rows * self.shape[1] + local_columns, weights))
+
+    @staticmethod
+    def __covered_cells(grid: GridIndex, area: dict) -> tuple:
+        """(rows, columns) of the grid cells covered by the area"""
+        if is_polygon(area):
+            polygon = PolygonMask.get(grid, area['polygon'])
+            return polygon.rows, polygon.columns
+        rows, columns = [], []
+        for lat_slice, lon_slice in grid.slabs(area):
+            slab_rows, slab_columns = np.meshgrid(np.arange(len(grid.lat))[lat_slice],
+                                                  np.arange(len(grid.lon))[lon_slice], indexing='ij')
+            rows.append(slab_rows.ravel())
+            columns.append(slab_columns.ravel())
+        return np.concatenate(rows), np.concatenate(columns)
+
+    def indexers(self) -> dict:
+        """Indexers (for isel) of the grid points needed by the regions"""
+        return {'lat': self.rows, 'lon': self.columns}
+
+    def reduce(self, values: np.ndarray) -> np.ndarray:
+        """Weighted means of values (..., lat, lon) on the needed grid points. NaNs are ignored.
+        Returns an array (..., regions)."""
+        values = np.asarray(values, dtype=float)
+        flat = values.reshape(values.shape[:-2] + (-1,))
+        means = []
+        for rows, columns, cells, weights in self.cells:
+            gathered = flat[..., cells]
+            finite = np.isfinite(gathered)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                means.append((np.where(finite, gathered, 0) @ weights) / (finite @ weights))
+        return np.stack(means, axis=-1)
+
+    def reduce_along(self, values: np.ndarray, dim: str, region: int = 0) -> np.ndarray:
+        """Weighted means of values (..., lat, lon) of one region along dim ('lat' or 'lon'), e.g. the profile
+        over the longitudes for dim='lat'. NaNs are ignored. Returns an array (..., lon) or (..., lat)."""
+        values = np.asarray(values, dtype=float)
+        rows, columns, cells, weights = self.cells[region]
+        gathered = values.reshape(values.shape[:-2] + (-1,))[..., cells]
+        finite = np.isfinite(gathered)
+        groups, size = (columns, self.shape[1]) if dim == 'lat' else (rows, self.shape[0])
+        sums = np.zeros(values.shape[:-2] + (size,))
+        counts = np.zeros(values.shape[:-2] + (size,))
+        np.add.at(sums, (Ellipsis, groups), np.where(finite, gathered, 0) * weights)
+        np.add.at(counts, (Ellipsis, groups), finite * weights)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return sums / counts
@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from contextlib import contextmanager
+
+
+def default_cache_dir() -> str:
+    """Directory shared by all kernels and users on this node. Can be overridden with METTOOL_CACHE_DIR."""
+    return os.environ.get('METTOOL_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'mettool_cache'))
+
+
+def create_cache_dir(cache_dir: str):
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir, exist_ok=True)
+        make_shared(cache_dir)
+
+
+def make_shared(filepath: str):
+    """Makes a cache directory/file writable for other users. Only possible for the owner, so errors are ignored."""
+    try:
+        os.chmod(filepath, 0o777 if os.path.isdir(filepath) else 0o666)
+    except OSError:
+        pass
+
+
+def make_database_shared(db_path: str):
+    """Makes the database and its WAL files writable for other users. SQLite creates the -wal and -shm files
+    with the umask of the user opening the database first, so this is repeated on every connection
+    (by whoever owns the files at that moment)."""
+    for filepath in (db_path, db_path + '-wal', db_path + '-shm'):
+        if os.path.exists(filepath):
+            make_shared(filepath)
+
+
+@contextmanager
+def open_database(db_path: str):
+    """Yields a connection to a shared SQLite database in WAL mode and commits on success.
+    Concurrent writers wait for each other up to a minute."""
+    con = sqlite3.connect(db_path, timeout=60)
+    try:
+        con.execute('PRAGMA journal_mode=WAL')
+        make_database_shared(db_path)
+        with con:
+            yield con
+        make_database_shared(db_path)  # The -wal file may only be created by the first write
+    finally:
+        con.close()
+
+
+def to_jsonable(value):
+    """Converts pint quantities and numpy values into something json can serialize deterministically"""
+    if hasattr(value, 'magnitude') and hasattr(value, 'units'):
+        return [to_jsonable(value.magnitude), str(value.units)]
+    if isinstance(value, dict):
+        return {str(key): to_jsonable(val) for key, val in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(val) for val in value]
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    return value
+
+
+class ResultCache:
+    """Content addressed on-disk cache of per-file reduction results (e.g. area means).
+    An entry is keyed by the identity of the file (path, size, mtime) and a description of the reduction
+    (variable, area, level, ...), so a modified file is never served from the cache.
+    The cache is a SQLite database in WAL mode, which allows concurrent readers and writers from several
+    processes. Once the database exceeds max_bytes, the least recently used entries are evicted. The access time
+    of an entry is only updated once per access_resolution seconds, so lookups of recently used entries do not
+    write to the shared database.
+    """
+    access_resolution = 3600
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = 2 ** 30):
+        self.cache_dir = cache_dir if cache_dir is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+        create_cache_dir(self.cache_dir)
+        self.db_path = os.path.join(self.cache_dir, 'results.sqlite')
+        with open_database(self.db_path) as con:
+            con.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT, accessed REAL)')
+            con.execute('CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)')
+
+    @staticmethod
+    def file_identity(filepath: str) -> list:
+        """Raises OSError if the file does not exist"""
+        stat = os.stat(filepath)
+        return [os.path.realpath(filepath), stat.st_size, stat.st_mtime_ns]
+
+    @staticmethod
+    def key(file_identity: list, reduction: dict) -> str:
+        description = json.dumps([file_identity, to_jsonable(reduction)], sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def get_many(self, keys: list) -> dict:
+        """Returns dictionary of all keys found in the cache and their values"""
+        found = dict()
+        stale = []  # Found entries whose access time is older than access_resolution
+        keys = list(keys)
+        now = time.time()
+        with open_database(self.db_path) as con:
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = con.execute(f'SELECT key, value, accessed FROM results WHERE key IN ({placeholders})',
+                                   chunk).fetchall()
+                found.update({key: json.loads(value) for key, value, accessed in rows})
+                stale.extend(key for key, value, accessed in rows if accessed < now - self.access_resolution)
+            for i in range(0, len(stale), 500):  # Only then a write transaction is started
+                chunk = stale[i:i + 500]
+                con.execute(f"UPDATE results SET accessed = ? WHERE key IN ({','.join('?' * len(chunk))})",
+                            [now] + chunk)
+        return found
+
+    def put_many(self, items: dict):
+        """Stores key -> value pairs. Values have to be json serializable (floats, lists, ...)"""
+        if not items:
+            return
+        now = time.time()
+        with open_database(self.db_path) as con:
+            con.executemany('INSERT OR REPLACE INTO results (key, value, accessed) VALUES (?, ?, ?)',
+                            [(key, json.dumps(to_jsonable(value)), now) for key, value in items.items()])
+            used = self.__used_bytes(con)
+            if used > self.max_bytes:
+                # Evict down to 90% to avoid evicting on every write
+                self.__evict(con, 1 - self.max_bytes * 0.9 / used)
+
+    @staticmethod
+    def __used_bytes(con) -> int:
+        """Bytes of the pages in use (without free pages, which SQLite reuses for new entries)"""
+        page_count, free_count, page_size = (con.execute(f'PRAGMA {pragma}').fetchone()[0]
+                                             for pragma in ('page_count', 'freelist_count', 'page_size'))
+        return (page_count - free_count) * page_size
+
+    @staticmethod
+    def __evict(con, fraction: float):
+        """Deletes the least recently used entries holding fraction of the stored bytes"""
+        stored = con.execute('SELECT SUM(length(key) + length(value)) FROM results').fetchone()[0] or 0
+        evicted, freed = [], 0
+        for key, size in con.execute('SELECT key, length(key) + length(value) FROM results ORDER BY accessed'):
+            if freed >= stored * fraction:
+                break
+            evicted.append(key)
+            freed += size
+        for i in range(0, len(evicted), 500):
+            chunk = evicted[i:i + 500]
+            con.execute(f"DELETE FROM results WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+
+    def clear(self):
+        with open_database(self.db_path) as con:
+            con.execute('DELETE FROM results')
@@ -0,0 +1,217 @@
+import numpy as np
+
+
+class Moments:
+    """Count, mean and variance of a stream of arrays (Welford), elementwise and NaN-aware.
+    Partial results (e.g. of parallel workers) are combined with merge (Chan et al.)."""
+
+    def __init__(self):
+        self.count = None
+        self.mean = None
+        self.m2 = None  # Sum of squared differences from the mean
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        if self.count is None:
+            self.count = np.zeros(values.shape)
+            self.mean = np.zeros(values.shape)
+            self.m2 = np.zeros(values.shape)
+        valid = np.isfinite(values)
+        self.count += valid
+        delta = np.where(valid, values - self.mean, 0)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.mean += np.where(valid, delta / self.count, 0)
+        self.m2 += np.where(valid, delta * (values - self.mean), 0)
+
+    def merge(self, other: 'Moments'):
+        if other.count is None:
+            return
+        if self.count is None:
+            self.count, self.mean, self.m2 = other.count.copy(), other.mean.copy(), other.m2.copy()
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.mean = np.where(count > 0, self.mean + delta * other.count / count, 0)
+            self.m2 = np.where(count > 0, self.m2 + other.m2 + delta ** 2 * self.count * other.count / count, 0)
+        self.count = count
+
+    def get_mean(self) -> np.ndarray:
+        return np.where(self.count > 0, self.mean, np.nan)
+
+    def get_variance(self, ddof: int = 1) -> np.ndarray:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(self.count > ddof, self.m2 / (self.count - ddof), np.nan)
+
+
+class Extremes:
+    """Elementwise minimum and maximum of a stream of arrays, NaN-aware and mergeable."""
+
+    def __init__(self):
+        self.min = None
+        self.max = None
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        if self.min is None:
+            self.min = np.full(values.shape, np.inf)
+            self.max = np.full(values.shape, -np.inf)
+        np.fmin(self.min, values, out=self.min)
+        np.fmax(self.max, values, out=self.max)
+
+    def merge(self, other: 'Extremes'):
+        if other.min is None:
+            return
+        if self.min is None:
+            self.min, self.max = other.min.copy(), other.max.copy()
+            return
+        np.fmin(self.min, other.min, out=self.min)
+        np.fmax(self.max, other.max, out=self.max)
+
+    def get_min(self) -> np.ndarray:
+        return np.where(np.isfinite(self.min), self.min, np.nan)
+
+    def get_max(self) -> np.ndarray:
+        return np.where(np.isfinite(self.max), self.max, np.nan)
+
+
+class QuantileSketch:
+    """Approximate quantiles of a stream of arrays in constant memory: an elementwise histogram with a fixed
+    number of bins. Every element has its own aligned block, [k * span, (k + 1) * span) or [-span / 2, span / 2)
+    with span a power of two, so variables of very different scales keep their resolution. Blocks of all
+    sketches have aligned bins, so sketches can be merged. Values outside of the block widen it and adjacent
+    bins are combined. The error of a quantile is at most the width of a bin, quantiles are clamped to the
+    observed minimum and maximum."""
+
+    def __init__(self, bins: int = 256):
+        self.bins = bins
+        self.counts = None  # Shape (bins,) + shape of the values
+        self.lower = None  # Block per element, NaN for elements without values yet
+        self.span = None
+        self.extremes = Extremes()
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        valid = np.isfinite(values)
+        if self.counts is None:
+            self.__allocate(values.shape)
+        self.extremes.add(values)
+        if not valid.any():
+            return
+        self.__cover(np.where(valid, values, np.nan), np.where(valid, values, np.nan), np.zeros(values.shape))
+        width = self.span / self.bins
+        with np.errstate(invalid='ignore'):
+            scaled = np.where(valid, (values - self.lower) / width, 0)
+        index = np.clip(np.nan_to_num(scaled).astype(np.int64), 0, self.bins - 1)
+        counts = self.counts.reshape(self.bins, -1)
+        np.add.at(counts, (index.ravel(), np.arange(index.size)), valid.ravel())
+
+    def merge(self, other: 'QuantileSketch'):
+        if other.counts is None:
+            return
+        if self.counts is None:
+            self.__allocate(other.counts.shape[1:])
+        self.extremes.merge(other.extremes)
+        last_bin = other.lower + other.span - other.span / other.bins  # Lower edge of the last bin
+        self.__cover(other.lower, last_bin, np.nan_to_num(other.span))
+        self.counts += other.__rebinned(self.lower, self.span)
+
+    def get_quantile(self, q: float) -> np.ndarray:
+        """Quantile q (0..1) by linear interpolation within the bin, clamped to [min, max]"""
+        if self.counts is None:
+            return np.nan
+        cumulative = np.cumsum(self.counts, axis=0)
+        total = cumulative[-1]
+        target = q * total
+        bin_index = np.minimum((cumulative < target[np.newaxis]).sum(axis=0), self.bins - 1)
+        below = np.take_along_axis(cumulative, np.maximum(bin_index - 1, 0)[np.newaxis], axis=0)[0]
+        below = np.where(bin_index > 0, below, 0)
+        in_bin = np.take_along_axis(self.counts, bin_index[np.newaxis], axis=0)[0]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fraction = np.clip(np.where(in_bin > 0, (target - below) / in_bin, 0.5), 0, 1)
+        quantile = self.lower + (bin_index + fraction) * (self.span / self.bins)
+        quantile = np.clip(quantile, self.extremes.get_min(), self.extremes.get_max())
+        return np.where(total > 0, quantile, np.nan)
+
+    @staticmethod
+    def block(low, high, min_span=0) -> tuple:
+        """Smallest aligned blocks (lower, span) with a span of at least min_span containing [low, high],
+        elementwise. NaN for elements with NaN bounds."""
+        low, high, min_span = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (low, high, min_span)))
+        defined = np.isfinite(low) & np.isfinite(high)
+        low = np.where(defined, low, 0)
+        high = np.where(defined, high, 0)
+        span = 2.0 ** np.ceil(np.log2(np.maximum(np.maximum(high - low, min_span), 1e-12)))
+        symmetric = (low < 0) & (0 <= high)
+        while True:
+            outside = np.where(symmetric, (low < -span / 2) | (high >= span / 2),
+                               np.floor(low / span) != np.floor(high / span))
+            if not outside.any():
+                break
+            span = np.where(outside, span * 2, span)
+        lower = np.where(symmetric, -span / 2, np.floor(low / span) * span)
+        return np.where(defined, lower, np.nan), np.where(defined, span, np.nan)
+
+    def __allocate(self, shape: tuple):
+        self.counts = np.zeros((self.bins,) + tuple(shape), dtype=np.int32)
+        self.lower = np.full(shape, np.nan)
+        self.span = np.full(shape, np.nan)
+
+    def __cover(self, low, high, min_span):
+        """Widens the blocks until they contain [low, high] (and the current blocks), elementwise"""
+        current_last = self.lower + self.span - self.span / self.bins  # Lower edge of the last bin
+        lower, span = self.block(np.fmin(low, self.lower), np.fmax(high, current_last),
+                                 np.fmax(min_span, np.nan_to_num(self.span)))
+        changed = np.isfinite(self.lower) & ((lower != self.lower) | (span != self.span))
+        if changed.any():
+            self.counts = self.__rebinned(lower, span)
+        self.lower, self.span = lower, span
+
+    def __rebinned(self, lower, span) -> np.ndarray:
+        """Counts of this sketch on blocks containing its own blocks (bins stay aligned)"""
+        edges = self.lower[np.newaxis] + np.arange(self.bins).reshape((-1,) + (1,) * self.lower.ndim) * \
+            (self.span / self.bins)[np.newaxis]
+        with np.errstate(invalid='ignore'):
+            index = np.floor((edges - lower[np.newaxis]) / (span / self.bins)[np.newaxis])
+        index = np.clip(np.nan_to_num(index), 0, self.bins - 1).astype(np.intp).reshape(self.bins, -1)
+        counts = np.zeros_like(self.counts)
+        np.add.at(counts.reshape(self.bins, -1), (index, np.arange(index.shape[1])[np.newaxis]),
+                  self.counts.reshape(self.bins, -1))
+        return counts
+
+
+class StreamingStatistics:
+    """Mean, variance, minimum, maximum and quantiles of a stream of arrays (e.g. area means per file or
+    fields per grid point) in constant memory. Partial statistics of parallel workers are combined with merge.
+    Without bins no quantiles are computed (the sketch needs bins counters per element)."""
+
+    def __init__(self, bins: int = 256):
+        self.moments = Moments()
+        self.extremes = Extremes()
+        self.sketch = QuantileSketch(bins) if bins else None
+
+    def add(self, values):
+        self.moments.add(values)
+        self.extremes.add(values)
+        if self.sketch is not None:
+            self.sketch.add(values)
+
+    def merge(self, other: 'StreamingStatistics') -> 'StreamingStatistics':
+        self.moments.merge(other.moments)
+        self.extremes.merge(other.extremes)
+        if self.sketch is not None and other.sketch is not None:
+            self.sketch.merge(other.sketch)
+        return self
+
+    def empty(self) -> bool:
+        return self.moments.count is None
+
+    def result(self, quantiles=(0.05, 0.5, 0.95)) -> dict:
+        """Maps statistic name to array"""
+        result = {'count': self.moments.count, 'mean': self.moments.get_mean(),
+                  'std': np.sqrt(self.moments.get_variance()),
+                  'min': self.extremes.get_min(), 'max': self.extremes.get_max()}
+        if self.sketch is not None:
+            for q in quantiles:
+                result[f"q{q * 100:g}"] = self.sketch.get_quantile(q)
+        return result
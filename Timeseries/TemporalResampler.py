@@ -0,0 +1,50 @@
+import numpy as np
+
+from Timeseries.StreamingStatistics import Moments
+
+rules = ['none', 'daily', 'monthly', 'seasonal']
+
+
+def bucket_starts(dates, rule: str) -> np.ndarray:
+    """Start of the bucket of every date. Seasons are DJF, MAM, JJA and SON (December belongs to the next winter)."""
+    dates = np.asarray(dates, dtype='datetime64[s]')
+    if rule == 'daily':
+        return dates.astype('datetime64[D]').astype('datetime64[s]')
+    months = dates.astype('datetime64[M]')
+    if rule == 'monthly':
+        return months.astype('datetime64[s]')
+    if rule == 'seasonal':
+        month_numbers = months.astype(np.int64)  # Months since 1970-01, January is 0 (mod 12)
+        return (month_numbers - (month_numbers + 1) % 3).astype('datetime64[M]').astype('datetime64[s]')
+    return dates
+
+
+class TemporalResampler:
+    """Running aggregates (count and mean) per time bucket. Values are added while the files stream through,
+    aggregates of buckets computed earlier can be set directly (e.g. from the cache)."""
+
+    def __init__(self, rule: str):
+        if rule not in rules:
+            raise Exception(f"Unknown resampling rule '{rule}', possible rules: {rules}")
+        self.rule = rule
+        self.buckets = dict()  # Bucket start -> Moments
+
+    def add(self, bucket: np.datetime64, values):
+        self.buckets.setdefault(bucket, Moments()).add(values)
+
+    def set(self, bucket: np.datetime64, count, mean):
+        moments = Moments()
+        moments.count = np.asarray(count, dtype=float)
+        moments.mean = np.asarray(mean, dtype=float)
+        moments.m2 = np.zeros_like(moments.mean)
+        self.buckets[bucket] = moments
+
+    def get(self, bucket: np.datetime64) -> tuple:
+        """(count, mean) of a bucket"""
+        moments = self.buckets[bucket]
+        return moments.count, moments.get_mean()
+
+    def result(self) -> tuple:
+        """(bucket starts, means) sorted by time, means has one entry per bucket"""
+        starts = sorted(self.buckets)
+        return np.array(starts, dtype='datetime64[s]'), [self.buckets[start].get_mean() for start in starts]
@@ -1,6 +1,8 @@
 from ipywidgets import Output
 from Timeseries.TimeseriesModel import TimeseriesModel
 from SingleDataset.DebugCapturer import dbg
+from SingleDataset.CrossSectionGeometry import parse_points
+from SingleDataset.PolygonMask import parse_polygon
 
 class TimeseriesController:
     def __init__(self, view):
@@ -12,6 +14,52 @@ class TimeseriesController:
         return [var for var in TimeseriesModel.all_variable_names if var not in ['a', 'b', 'p0', 'ps']]
 
     def plot(self):
+        regions = self.__update_model()
+        mode = self.view.plot_mode.value
+        if mode != 'means':
+            # Hovmoeller diagrams of the selected area, time x pressure uses all levels
+            plevs = self.view.level_selection.get_plevs() if mode == 'plev' else self.view.level_selection.get_plev()
+            with self.plot_out:
+                self.model.plot_hovmoeller(regions['Selected area'], plevs, self.view.fp.get_file_dates(), dim=mode,
+                                           coslat=self.view.coslat_selection.value)
+            return
+        with self.plot_out:
+            self.model.plot_region_means(regions, self.view.level_selection.get_plev(), self.view.fp.get_file_dates(),
+                                         coslat=self.view.coslat_selection.value,
+                                         rule=self.view.resample_selection.value)
+
+    def export(self, filepath):
+        """Writes the region means of all selected variables to a CSV file"""
+        regions = self.__update_model()
+        with dbg:
+            try:
+                self.model.export_region_means(filepath, regions, self.view.level_selection.get_plev(),
+                                               self.view.fp.get_file_dates(), coslat=self.view.coslat_selection.value,
+                                               rule=self.view.resample_selection.value)
+                print(f"Region means written to {filepath}")
+            except Exception as e:
+                print(e)
+
+    def export_profiles(self, points, filepath):
+        """Writes vertical profiles at all levels at the points (text, e.g. '47.3, 11.4; 48.1, 16.2') of every
+        dataset to a CSV file"""
+        self.__update_model()
+        with dbg:
+            try:
+                self.model.export_profiles(filepath, parse_points(points), self.view.level_selection.get_plevs(),
+                                           self.view.fp.get_file_dates())
+                print(f"Profiles written to {filepath}")
+            except Exception as e:
+                print(e)
+
+    def show_statistics(self):
+        regions = self.__update_model()
+        with self.plot_out:
+            self.model.show_region_statistics(regions, self.view.level_selection.get_plev(),
+                                              coslat=self.view.coslat_selection.value)
+
+    def __update_model(self) -> dict:
+        """Passes the selection of the view to the model, returns the regions to compute"""
         self.model.set_paths(self.view.fp.get_file_paths())
         vars = self.view.var_select.value
         with dbg:
@@ -20,6 +68,30 @@ class TimeseriesController:
             except Exception as e:
                 print(e)
 
-        area = self.view.areaSelection.get_area()
-        with self.plot_out:
-            self.model.plot_area_mean(area, self.view.level_selection.get_press_index(), self.view.level_selection.plevs, self.view.fp.get_file_dates())
\ No newline at end of file
+        self.model.set_workers(self.view.worker_selection.value)
+        regions = {'Selected area': self.view.areaSelection.get_area()}
+        regions.update(self.model.regions)
+        return regions
+
+    def add_region(self, name):
+        """Stores the currently selected area as named region"""
+        with dbg:
+            try:
+                self.model.add_region(name, self.view.areaSelection.get_area())
+            except Exception as e:
+                print(e)
+        self.view.update_regions(list(self.model.regions.keys()))
+
+    def add_polygon_region(self, name, polygon):
+        """Stores a polygon (WKT or GeoJSON) as named region"""
+        with dbg:
+            try:
+                parse_polygon(polygon)
+                self.model.add_region(name, {'polygon': polygon})
+            except Exception as e:
+                print(f"Invalid polygon: {e}")
+        self.view.update_regions(list(self.model.regions.keys()))
+
+    def remove_region(self, name):
+        self.model.remove_region(name)
+        self.view.update_regions(list(self.model.regions.keys()))
\ No newline at end of file
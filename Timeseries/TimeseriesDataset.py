@@ -0,0 +1,294 @@
+import numpy as np
+import xarray as xr
+
+from SingleDataset.CrossSectionGeometry import CrossSectionGeometry
+from SingleDataset.DatasetSchema import DatasetSchema
+from SingleDataset.GridIndex import GridIndex
+from SingleDataset.LayerIntegrator import is_layer, layer_bounds, reduce_vertically
+from SingleDataset.PolygonMask import is_polygon
+from SingleDataset.VerticalInterpolator import VerticalInterpolator, bracketing_levels, target_levels
+from Timeseries.Prefetcher import Prefetcher
+from Timeseries.RegionWeights import RegionWeights
+from Timeseries.StreamingStatistics import StreamingStatistics
+
+
+class TimeseriesDataset:
+    """Selected dataset files as one lazy, time-indexed dataset.
+    The first file is the template: its coordinates, grid and attributes are read once and shared by all files.
+    The other files contribute their data variables (PRESS and varnames), their grid coordinates are checked
+    against the template when they are opened and their data is read when a reduction needs it.
+    Reductions run over the time axis in one pass.
+    """
+
+    def __init__(self, paths: list, varnames: list, time=None):
+        """:param time: Dates of the files (same order as paths), optional"""
+        self.paths = list(paths)
+        self.varnames = list(varnames)
+        self.time = np.asarray(time, dtype='datetime64[s]') if time is not None else np.arange(len(self.paths))
+        self.template = self.__read_template()
+
+    def __read_template(self) -> str:
+        """Reads coordinates and attributes from the first file that can be opened"""
+        error = None
+        for path in self.paths:
+            try:
+                dropvars = DatasetSchema.get(path).dropvars(self.varnames)
+                with xr.open_dataset(path, drop_variables=dropvars, decode_times=False) as template:
+                    template = template.squeeze(drop=True)
+                    press = template['PRESS']
+                    self.dims = press.dims
+                    self.sizes = dict(press.sizes)
+                    self.coords = {name: (coord.dims, coord.values, coord.attrs)
+                                   for name, coord in press.coords.items() if name in self.dims}
+                    self.attrs = {name: template[name].attrs for name in self.varnames + ['PRESS']}
+                self.grid = GridIndex.get(self.coords['lat'][1], self.coords['lon'][1])
+                return path
+            except Exception as e:
+                error = e
+        raise Exception(f"None of the {len(self.paths)} datasets can be opened: {error!r}")
+
+    def __len__(self) -> int:
+        return len(self.paths)
+
+    def open(self, i: int) -> xr.Dataset:
+        """Opens file i lazily with only PRESS and the variables (looked up in the schema of the file's layout).
+        The grid has to match the template, its coordinates and attributes are taken from the template."""
+        path = self.paths[i]
+        dset = xr.open_dataset(path, drop_variables=DatasetSchema.get(path).dropvars(self.varnames),
+                               decode_times=False).squeeze(drop=True)
+        dset = dset[list(dict.fromkeys(['PRESS'] + self.varnames))]
+        sizes = {dim: dset.sizes.get(dim) for dim in self.dims}
+        if sizes != self.sizes:
+            raise Exception(f"Grid {sizes} differs from {self.sizes} of {self.template}")
+        for name, (dims, values, attrs) in self.coords.items():
+            if name not in dset.coords or not np.allclose(dset[name].values, values):
+                raise Exception(f"Coordinate {name} of {path} differs from {self.template}")
+        dset = dset.assign_coords({name: (dims, values, attrs) for name, (dims, values, attrs)
+                                   in self.coords.items()})
+        for name, attrs in self.attrs.items():
+            dset[name].attrs = attrs
+        return dset
+
+    def read(self, i: int, indexers: dict = None, plev=None) -> xr.Dataset:
+        """Reads the grid points selected by indexers (e.g. from RegionWeights) and the hybrid levels around plev
+        (pressure level(s) or a layer, see LayerIntegrator.layer) of file i into memory"""
+        dset = self.open(i)
+        if indexers is not None:
+            dset = dset.isel(indexers)
+        if plev is not None:
+            press = dset['PRESS'].load()
+            if is_layer(plev):  # Bounds outside of the columns still need all levels up to the surface (or top)
+                targets = np.clip(layer_bounds(plev, press), float(press.min()), float(press.max()))
+            else:
+                targets = target_levels(plev, press)
+            levels = bracketing_levels(press, targets)
+            if levels is not None:
+                dset = dset.isel({self.dims[0]: levels})
+        return dset.load()
+
+    def region_means(self, regions: dict, plev, executor, coslat: bool = False) -> tuple:
+        """Means of the variables at pressure level plev (or over a layer, see LayerIntegrator.layer) over all
+        regions for every time step. Each file is read and interpolated once for all regions.
+        :param regions: Maps name to area (dictionary with keys ['right', 'left', 'top', 'bottom'])
+        :param coslat: Weight the grid points with cos(latitude)
+        :return: (means, failures). means is a DataArray with dimensions (time, variable, region),
+                 NaN for failed files. failures maps the path of every failed file to its error message.
+        """
+        weights = RegionWeights(self.grid, regions, coslat=coslat)
+        results, failures = executor.run(RegionMeanTask(self, weights, plev), list(range(len(self))))
+        means = np.full((len(self), len(self.varnames), len(weights.names)), np.nan)
+        for i, result in enumerate(results):
+            if result is not None:
+                means[i] = result
+        means = xr.DataArray(means, dims=['time', 'variable', 'region'],
+                             coords={'time': ('time', self.time), 'variable': ('variable', self.varnames),
+                                     'region': ('region', weights.names)})
+        return means, {self.paths[i]: error for i, error in failures.items()}
+
+    def hovmoeller(self, area: dict, plevs, executor, dim: str = 'plev', coslat: bool = False) -> tuple:
+        """Hovmoeller diagram of the area: the area mean at every level of plevs (dim='plev'), or the mean over the
+        latitudes per longitude (dim='lon') or over the longitudes per latitude (dim='lat') at plev, for every
+        time step. Each file is read and interpolated to all levels once.
+        :return: (values, failures). values is a DataArray with dimensions (time, variable, dim), NaN for failed
+                 files. failures maps the path of every failed file to its error message.
+        """
+        weights = RegionWeights(self.grid, {'area': area}, coslat=coslat)
+        if dim == 'plev':
+            coord = np.atleast_1d(getattr(plevs, 'magnitude', plevs)).astype(float)
+            order = np.arange(len(coord))
+        elif dim == 'lat':
+            coord = self.coords['lat'][1][weights.rows]
+            order = np.arange(len(coord))
+        elif dim == 'lon':
+            coord = self.coords['lon'][1][weights.columns]
+            # A region across the date line continues west of its first column (e.g. 350 -> -10)
+            gaps = np.diff(coord)
+            if gaps.size > 0 and gaps.max() > 180:
+                coord = np.where(np.arange(len(coord)) > np.argmax(gaps), coord - 360, coord)
+            order = np.argsort(coord)
+        else:
+            raise Exception(f"Unknown Hovmoeller dimension '{dim}', possible are ['plev', 'lat', 'lon']")
+
+        results, failures = executor.run(HovmoellerTask(self, weights, plevs, dim), list(range(len(self))))
+        values = np.full((len(self), len(self.varnames), len(coord)), np.nan)
+        for i, result in enumerate(results):
+            if result is not None:
+                values[i] = result[:, order]
+        values = xr.DataArray(values, dims=['time', 'variable', dim],
+                              coords={'time': ('time', self.time), 'variable': ('variable', self.varnames),
+                                      dim: (dim, coord[order])})
+        return values, {self.paths[i]: error for i, error in failures.items()}
+
+    def profiles(self, points: list, plevs, executor) -> tuple:
+        """Vertical profiles of the variables at many (lat, lon) points for every time step. The horizontal
+        stencil is computed once for all files, each file reads only the rows and columns around the points
+        and interpolates all columns in one batched call.
+        :return: (profiles, failures). profiles is a DataArray with dimensions (time, variable, plev, point),
+                 NaN for failed files. failures maps the path of every failed file to its error message.
+        """
+        geometry = CrossSectionGeometry.get_points(self.coords['lat'][1], self.coords['lon'][1], points)
+        levels = np.atleast_1d(getattr(plevs, 'magnitude', plevs)).astype(float)
+        results, failures = executor.run(ProfileTask(self, geometry, plevs), list(range(len(self))))
+        profiles = np.full((len(self), len(self.varnames), len(levels), len(geometry.lat)), np.nan)
+        for i, result in enumerate(results):
+            if result is not None:
+                profiles[i] = result
+        profiles = xr.DataArray(profiles, dims=['time', 'variable', 'plev', 'point'],
+                                coords={'time': ('time', self.time), 'variable': ('variable', self.varnames),
+                                        'plev': ('plev', levels), 'point': ('point', np.arange(len(geometry.lat))),
+                                        'lat': ('point', geometry.lat), 'lon': ('point', geometry.lon)})
+        return profiles, {self.paths[i]: error for i, error in failures.items()}
+
+    def statistics(self, plev, executor, area: dict = None, bins: int = None, quantiles=(0.05, 0.5, 0.95)) -> tuple:
+        """Statistics over the time axis per grid point of the area (whole grid if None) at pressure level plev,
+        in constant memory. The files are split into chunks, every chunk accumulates its own StreamingStatistics
+        (in a worker) and the partial statistics are merged.
+        :param bins: Bins of the quantile sketch per grid point, None computes no quantiles
+        :return: (statistics, failures). statistics is a Dataset with one variable per statistic (e.g. 'mean',
+                 'std', 'q50') of dimensions (variable, lat, lon). failures maps the path of every failed file
+                 to its error message.
+        """
+        lon = self.coords['lon'][1]
+        if area is None:
+            indexers = {'lat': slice(None), 'lon': slice(None)}
+        elif is_polygon(area):
+            indexers = RegionWeights(self.grid, {'area': area}).indexers()
+            lon = lon[indexers['lon']]
+        else:  # Columns from west to east, labels continuous across the end of the grid (like GridIndex.select)
+            columns, lon = self.grid.lon_columns(area)
+            indexers = {'lat': self.grid.lat_slice(area['bottom'], area['top']), 'lon': columns}
+        chunks = [tuple(chunk.tolist()) for chunk in
+                  np.array_split(np.arange(len(self)), max(1, min(len(self), 2 * executor.workers)))]
+        # Chunks run in parallel, each reads ahead within its share of the memory budget
+        task = StatisticsTask(self, indexers, plev, bins, executor.prefetch_depth,
+                              executor.memory_budget // max(1, executor.workers))
+        results, chunk_failures = executor.run(task, chunks)
+        statistics = StreamingStatistics(bins)
+        failures = dict()
+        for chunk, result in zip(chunks, results):
+            if result is None:
+                failures.update({self.paths[i]: chunk_failures[chunk] for i in chunk})
+            else:
+                statistics.merge(result[0])
+                failures.update(result[1])
+        if statistics.empty():
+            raise Exception('No dataset could be processed')
+        coords = {'variable': ('variable', self.varnames),
+                  'lat': ('lat', self.coords['lat'][1][indexers['lat']]),
+                  'lon': ('lon', lon)}
+        return xr.Dataset({name: (('variable', 'lat', 'lon'), values)
+                           for name, values in statistics.result(quantiles).items()}, coords=coords), failures
+
+
+class StatisticsTask:
+    """Accumulates statistics of the interpolated fields over a chunk of time steps of a TimeseriesDataset.
+    Returns (statistics, failures) of the chunk."""
+
+    def __init__(self, dataset: TimeseriesDataset, indexers: dict, plev, bins: int, prefetch_depth: int,
+                 memory_budget: int):
+        self.dataset = dataset
+        self.indexers = indexers
+        self.plev = plev
+        self.bins = bins
+        self.prefetch_depth = prefetch_depth
+        self.memory_budget = memory_budget
+
+    def read(self, i: int) -> xr.Dataset:
+        return self.dataset.read(i, indexers=self.indexers, plev=self.plev)
+
+    def __call__(self, chunk: tuple) -> tuple:
+        statistics = StreamingStatistics(self.bins)
+        failures = dict()
+        for i, dset, error in Prefetcher(self.read, list(chunk), depth=self.prefetch_depth,
+                                          memory_budget=self.memory_budget):
+            try:
+                if error is not None:
+                    raise error
+                reduced = reduce_vertically(dset['PRESS'], self.plev, *[dset[var] for var in self.dataset.varnames])
+                statistics.add(np.stack([values[0] for values in reduced]))
+            except Exception as e:
+                failures[self.dataset.paths[i]] = repr(e)
+        return statistics, failures
+
+
+class RegionMeanTask:
+    """Means of the variables of a TimeseriesDataset over all regions at pressure level plev for a single time step."""
+
+    def __init__(self, dataset: TimeseriesDataset, weights: RegionWeights, plev):
+        self.dataset = dataset
+        self.weights = weights
+        self.plev = plev
+
+    def prefetch(self, i: int) -> xr.Dataset:
+        return self.dataset.read(i, indexers=self.weights.indexers(), plev=self.plev)
+
+    def __call__(self, i: int, dset: xr.Dataset = None) -> np.ndarray:
+        """Returns array (variables, regions)"""
+        if dset is None:
+            dset = self.prefetch(i)
+        reduced = reduce_vertically(dset['PRESS'], self.plev, *[dset[var] for var in self.dataset.varnames])
+        return self.weights.reduce(np.stack([values[0] for values in reduced]))
+
+
+class HovmoellerTask:
+    """Area mean profile of the variables of a TimeseriesDataset for a single time step: over the pressure levels
+    (dim='plev') or along the longitudes or latitudes at a single level (dim='lon' or 'lat')."""
+
+    def __init__(self, dataset: TimeseriesDataset, weights: RegionWeights, plevs, dim: str):
+        self.dataset = dataset
+        self.weights = weights
+        self.plevs = plevs
+        self.dim = dim
+
+    def prefetch(self, i: int) -> xr.Dataset:
+        return self.dataset.read(i, indexers=self.weights.indexers(), plev=self.plevs)
+
+    def __call__(self, i: int, dset: xr.Dataset = None) -> np.ndarray:
+        """Returns array (variables, dim)"""
+        if dset is None:
+            dset = self.prefetch(i)
+        interpolated = np.stack(reduce_vertically(dset['PRESS'], self.plevs,
+                                                  *[dset[var] for var in self.dataset.varnames]))
+        if self.dim == 'plev':
+            return self.weights.reduce(interpolated)[..., 0]
+        return self.weights.reduce_along(interpolated[:, 0], 'lat' if self.dim == 'lon' else 'lon')
+
+
+class ProfileTask:
+    """Vertical profiles of the variables of a TimeseriesDataset at many points for a single time step."""
+
+    def __init__(self, dataset: TimeseriesDataset, geometry: CrossSectionGeometry, plevs):
+        self.dataset = dataset
+        self.geometry = geometry
+        self.plevs = plevs
+
+    def prefetch(self, i: int) -> xr.Dataset:
+        return self.dataset.read(i, indexers=self.geometry.indexers(), plev=self.plevs)
+
+    def __call__(self, i: int, dset: xr.Dataset = None) -> np.ndarray:
+        """Returns array (variables, levels, points)"""
+        if dset is None:
+            dset = self.prefetch(i)
+        columns = self.geometry.apply_subset(dset['PRESS'], *[dset[var] for var in self.dataset.varnames])
+        interpolator = VerticalInterpolator(columns[0], target_levels(self.plevs, dset['PRESS']))
+        return np.stack(interpolator.apply(*columns[1:]))
@@ -0,0 +1,81 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from Timeseries.Prefetcher import Prefetcher
+
+installed_task = None  # Task of a worker process, installed once when the worker starts
+
+
+def install_task(task):
+    global installed_task
+    installed_task = task
+
+
+def run_installed_task(path):
+    return installed_task(path)
+
+
+class TimeseriesExecutor:
+    """Runs a per-file task over a list of paths, serially or on a pool of workers.
+    Results keep the order of the paths. A failing file is reported instead of aborting the whole run.
+    In serial mode, tasks providing a prefetch(path) method get the next files read by a Prefetcher."""
+
+    def __init__(self, workers: int = None, use_processes: bool = True, prefetch_depth: int = 4,
+                 memory_budget: int = 2 * 1024 ** 3, start_method: str = None):
+        """:param start_method: Start method of worker processes ('spawn', 'forkserver', 'fork'). None uses
+                             'forkserver' where available, else 'spawn': 'fork' (the default on Linux before
+                             Python 3.14) is unsafe in a threaded kernel."""
+        self.workers = workers if workers is not None else os.cpu_count()
+        self.use_processes = use_processes
+        if start_method is None:
+            start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self.start_method = start_method
+        self.prefetch_depth = prefetch_depth
+        self.memory_budget = memory_budget
+
+    def set_workers(self, workers: int):
+        self.workers = max(1, int(workers))
+
+    def run(self, task, paths: list) -> tuple:
+        """Calls task(path) for every path.
+        :return: (results, failures). results has one entry per path (None for failed files),
+                 failures maps the path of every failed file to its error message.
+        """
+        results = [None] * len(paths)
+        failures = dict()
+        if (self.workers <= 1 or len(paths) < 2) and self.prefetch_depth > 0 and hasattr(task, 'prefetch'):
+            prefetcher = Prefetcher(task.prefetch, paths, depth=self.prefetch_depth, memory_budget=self.memory_budget)
+            for i, (path, loaded, error) in enumerate(prefetcher):
+                try:
+                    if error is not None:
+                        raise error
+                    results[i] = task(path, loaded)
+                except Exception as e:
+                    failures[path] = repr(e)
+            return results, failures
+        if self.workers <= 1 or len(paths) < 2:
+            for i, path in enumerate(paths):
+                try:
+                    results[i] = task(path)
+                except Exception as e:
+                    failures[path] = repr(e)
+            return results, failures
+
+        with self.__create_pool(task) as pool:
+            # Worker processes get the task once (it may hold large weight matrices), then only the paths
+            futures = [pool.submit(run_installed_task, path) if self.use_processes else pool.submit(task, path)
+                       for path in paths]
+            for i, (path, future) in enumerate(zip(paths, futures)):
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    failures[path] = repr(e)
+        return results, failures
+
+    def __create_pool(self, task):
+        if not self.use_processes:
+            return ThreadPoolExecutor(max_workers=self.workers)
+        context = multiprocessing.get_context(self.start_method)
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=context, initializer=install_task,
+                                   initargs=(task,))
@@ -1,6 +1,8 @@
 import ipywidgets as widgets
 from metpy.units import units
 
+from SingleDataset.LayerIntegrator import layer, operations
+
 
 class TimeseriesLevel:
     levels = ""
@@ -17,12 +19,25 @@ class TimeseriesLevel:
             options=self.plevs,
             value=self.plevs[4],
         )
+        # Instead of a single level the variables can be reduced over a layer (on the hybrid levels)
+        self.layer_selection = widgets.Checkbox(value=False, description='Layer instead of level')
+        self.layer_top_selection = widgets.Dropdown(description='Layer top: ', options=self.plevs, value=self.plevs[5])
+        self.layer_bottom_selection = widgets.Dropdown(description='Layer bottom: ', options=self.plevs,
+                                                       value=self.plevs[1])
+        self.layer_operation_selection = widgets.Dropdown(description='Operation: ', options=operations)
 
     def get_plevs(self) -> list:
         """Returns list of pressure levels. Sorted and with unit"""
         return self.plevs;
 
-    def get_press_index(self):
-        """Get pressure niveau corresponding to the index in the DataArrays"""
-        plevs_reversed = list(self.plevs)[::-1]
-        return plevs_reversed.index(self.plevels_selection.value)
+    def get_plev(self):
+        """Returns selected pressure level (value with unit), or the selected layer (see LayerIntegrator.layer)"""
+        if self.layer_selection.value:
+            return layer(self.layer_top_selection.value, self.layer_bottom_selection.value,
+                         self.layer_operation_selection.value)
+        return self.plevels_selection.value
+
+    def get_widget(self):
+        return widgets.VBox([self.plevels_selection, self.layer_selection,
+                             widgets.HBox([self.layer_top_selection, self.layer_bottom_selection]),
+                             self.layer_operation_selection])
@@ -3,10 +3,18 @@ from SingleDataset.DebugCapturer import dbg
 import matplotlib.pyplot as plt
 from matplotlib.dates import AutoDateLocator, AutoDateFormatter, date2num
 import datetime
+import sqlite3
 
-from Timeseries.SDModelAdapter import SDModelAdapter
+import numpy as np
+import pandas as pd
+import xarray as xr
+from IPython.display import display
 
-maxvars = 2
+from Timeseries.ResultCache import ResultCache
+from Timeseries.StreamingStatistics import StreamingStatistics
+from Timeseries.TemporalResampler import TemporalResampler, bucket_starts
+from Timeseries.TimeseriesDataset import TimeseriesDataset
+from Timeseries.TimeseriesExecutor import TimeseriesExecutor
 
 
 class TimeseriesModel:
@@ -16,13 +24,24 @@ class TimeseriesModel:
                           'ZETA',
                           'BVF', 'BVF_WET', 'TROP1', 'TROP2']
 
+    statistics_batch = 256  # Datasets whose region means are held in memory at once by compute_region_statistics
+
     def __init__(self):
         self.dsetpaths: list = []
         self.varnames = []
+        self.regions = dict()  # Named regions (name -> area) plotted in addition to the selected area
+        self.executor = TimeseriesExecutor()
+        try:
+            self.cache = ResultCache()
+        except (OSError, sqlite3.Error) as e:
+            with dbg:
+                print(f"Result cache disabled: {e}")
+            self.cache = None
 
-    def plot_area_mean(self, area, level, plevs, file_dates: list):
-        """Creates plot for mean of added variables at the specified area and pressurelevel."""
-        vars_to_drop = [var for var in TimeseriesModel.all_variable_names if var not in self.varnames + ['PRESS']]
+    def plot_region_means(self, regions: dict, plev, file_dates: list, coslat: bool = False, rule: str = 'none'):
+        """Creates plot for means of added variables over the named regions (name -> area) at the specified
+        pressurelevel (value with unit). One subplot per variable (small multiples), one line per region.
+        With a resampling rule ('daily', 'monthly', 'seasonal') one value per time bucket is plotted."""
         # print(self.dsetpaths)
         if len(self.dsetpaths) < 2:
             # raise Exception('Too few Datasets')
@@ -35,46 +54,354 @@ class TimeseriesModel:
                 print("No variables added.")
                 return
 
-        int_dates = []
-        for date in file_dates:
-            int_date = date2num(date)
-            int_dates.append(int_date)
+        means = self.region_means_frame(regions, plev, file_dates, coslat=coslat, rule=rule)
+        fig = plt.figure(num='', figsize=(8, 2.5 * len(self.varnames)))
+        fig.clf()
+        axes = fig.subplots(len(self.varnames), 1, sharex=True, squeeze=False)[:, 0]
+        locator = AutoDateLocator()
+        axes[-1].xaxis.set_major_locator(locator)
+        axes[-1].xaxis.set_major_formatter(AutoDateFormatter(locator))
+        int_dates = date2num(means.index.to_pydatetime())
+        for ax, var in zip(axes, self.varnames):
+            for name in regions:
+                ax.plot(int_dates, means[(var, name)].values, label=name)
+            ax.set_title(var)
+        if len(regions) > 1:
+            axes[0].legend()
+        fig.autofmt_xdate()
+
+    def export_region_means(self, filepath: str, regions: dict, plev, file_dates: list, coslat: bool = False,
+                            rule: str = 'none'):
+        """Writes the means of all added variables over the named regions to a CSV file (one column per variable
+        and region). Means computed for a plot before are taken from the cache."""
+        means = self.region_means_frame(regions, plev, file_dates, coslat=coslat, rule=rule)
+        means.columns = [f"{var} {name}" for var, name in means.columns]
+        means.to_csv(filepath, index_label='time')
 
-        averages = []
+    def region_means_frame(self, regions: dict, plev, file_dates: list, coslat: bool = False,
+                           rule: str = 'none') -> pd.DataFrame:
+        """Means of all added variables over the named regions, computed in a single pass over the datasets.
+        :return: DataFrame indexed by time with columns (variable, region). Failed datasets are left out.
+        """
+        if rule == 'none':
+            results, failures = self.compute_means(regions, plev, coslat=coslat)
+        else:
+            file_dates, results, failures = self.compute_resampled_means(regions, plev, rule, file_dates,
+                                                                         coslat=coslat)
+        self.__report_failures(failures)
 
-        for path in self.dsetpaths:
-            tmp = SDModelAdapter()
-            tmp.open_dset(path=path, dropvars=vars_to_drop)
-            for var in self.varnames:
-                tmp.add_var_to_plot(var)
-            averages.append(tmp.get_mean(area=area, level=level, plevs=plevs))
+        dates = []
+        values = []
+        for date, result in zip(file_dates, results):
+            if result is not None:
+                dates.append(date)
+                values.append(np.ravel(result))
+        columns = pd.MultiIndex.from_product([self.varnames, list(regions)], names=['variable', 'region'])
+        return pd.DataFrame(np.reshape(values, (len(values), len(columns))), columns=columns,
+                            index=pd.DatetimeIndex(dates, name='time'))
+
+    def plot_hovmoeller(self, area: dict, plevs, file_dates: list, dim: str = 'plev', coslat: bool = False):
+        """Creates Hovmoeller diagrams of the added variables over the area: time x pressure for all levels of plevs
+        (dim='plev') or time x longitude / time x latitude at the level plev (dim='lon' / 'lat').
+        One subplot per variable."""
+        if len(self.dsetpaths) < 2 or len(self.varnames) == 0:
+            with dbg:
+                print("Too few Datasets (minimum is 2) or no variables added.")
+            return
+        values, dates = self.compute_hovmoeller(area, plevs, file_dates, dim=dim, coslat=coslat)
+        if len(dates) == 0:
+            with dbg:
+                print("No dataset could be processed.")
+            return
 
-        fig, ax1 = plt.subplots(num='')
+        fig = plt.figure(num='', figsize=(8, 3 * len(self.varnames)))
+        fig.clf()
+        axes = fig.subplots(len(self.varnames), 1, sharex=True, squeeze=False)[:, 0]
         locator = AutoDateLocator()
-        ax1.xaxis.set_major_locator(locator)
-        ax1.xaxis.set_major_formatter(AutoDateFormatter(locator))
-        plt.clf()
-        #  Add labels etc etc
-        if len(self.varnames) == 1:
-            ax1.plot(int_dates, averages)
-        elif len(self.varnames) == 2:
-            ax1.plot([val[0] for val in averages])
-            ax2 = ax1.twinx()
-            ax2.plot([val[1] for val in averages])
+        axes[-1].xaxis.set_major_locator(locator)
+        axes[-1].xaxis.set_major_formatter(AutoDateFormatter(locator))
+        int_dates = date2num(pd.DatetimeIndex(dates).to_pydatetime())
+        for ax, var in zip(axes, self.varnames):
+            mesh = ax.pcolormesh(int_dates, values[dim].values, values.sel(variable=var).values.T, shading='nearest')
+            fig.colorbar(mesh, ax=ax)
+            ax.set_title(var)
+            if dim == 'plev':
+                ax.set_yscale('log')
+                ax.set_ylim(values[dim].values.max(), values[dim].values.min())
+                ax.set_ylabel('Pressure')
+            else:
+                ax.set_ylabel('Longitude' if dim == 'lon' else 'Latitude')
         fig.autofmt_xdate()
 
+    def compute_hovmoeller(self, area: dict, plevs, file_dates: list, dim: str = 'plev', coslat: bool = False) -> tuple:
+        """Hovmoeller values of the added variables (see TimeseriesDataset.hovmoeller) in a single pass over the
+        datasets. Profiles found in the cache are reused.
+        :return: (values, dates). values is a DataArray (time, variable, dim) of the processed datasets, dates
+                 their dates.
+        """
+        keys, cached = self.__lookup(self.dsetpaths, {var: {'op': 'hovmoeller', 'dim': dim, 'var': var, 'area': area,
+                                                            'plev': plevs, 'coslat': coslat}
+                                                      for var in self.varnames})
+
+        missing = [i for i, file_keys in enumerate(keys)
+                   if file_keys is None or any(key not in cached for key in file_keys.values())]
+        coord = None
+        computed = dict()
+        failures = dict()
+        if missing:
+            paths = [self.dsetpaths[i] for i in missing]
+            try:
+                dataset = TimeseriesDataset(paths, varnames=self.varnames)
+                values, failures = dataset.hovmoeller(area, plevs, self.executor, dim=dim, coslat=coslat)
+                coord = values[dim].values
+                for i, path, profiles in zip(missing, paths, values.values):
+                    if path not in failures:
+                        computed[i] = profiles
+            except Exception as e:
+                failures = {path: repr(e) for path in paths}
+            self.__report_failures(failures)
+            self.__store(keys, {i: {var: {'dim': coord, 'values': profiles[v]} for v, var in enumerate(self.varnames)}
+                                for i, profiles in computed.items()})
+
+        dates = []
+        rows = []
+        for i, file_keys in enumerate(keys):
+            if i in computed:
+                rows.append(computed[i])
+            elif i not in missing:
+                entries = [cached[file_keys[var]] for var in self.varnames]
+                coord = entries[0]['dim'] if coord is None else coord
+                rows.append([entry['values'] for entry in entries])
+            else:
+                continue
+            dates.append(file_dates[i])
+        coord = np.asarray(coord if coord is not None else [], dtype=float)
+        values = xr.DataArray(np.reshape(np.asarray(rows, dtype=float), (len(rows), len(self.varnames), len(coord))),
+                              dims=['time', 'variable', dim],
+                              coords={'variable': ('variable', self.varnames), dim: (dim, coord)})
+        return values, dates
+
+    def compute_profiles(self, points: list, plevs, file_dates: list = None) -> tuple:
+        """Vertical profiles of the added variables at many (lat, lon) points over all datasets, in a single
+        pass over the files (see TimeseriesDataset.profiles)."""
+        dataset = TimeseriesDataset(self.dsetpaths, varnames=self.varnames, time=file_dates)
+        return dataset.profiles(points, plevs, self.executor)
+
+    def export_profiles(self, filepath: str, points: list, plevs, file_dates: list):
+        """Writes the vertical profiles at the points to a CSV file, one row per time, variable, level and point"""
+        profiles, failures = self.compute_profiles(points, plevs, file_dates)
+        self.__report_failures(failures)
+        profiles.to_dataframe(name='value').to_csv(filepath)
+
+    def show_region_statistics(self, regions: dict, plev, coslat: bool = False):
+        """Displays mean, standard deviation, extremes and quantiles of the region means over all datasets"""
+        if len(self.dsetpaths) == 0 or len(self.varnames) == 0:
+            with dbg:
+                print("No datasets or no variables selected.")
+            return
+        statistics, failures = self.compute_region_statistics(regions, plev, coslat=coslat)
+        self.__report_failures(failures)
+        index = pd.MultiIndex.from_product([self.varnames, list(regions)], names=['variable', 'region'])
+        display(pd.DataFrame({name: np.ravel(values) for name, values in statistics.items()}, index=index))
+
+    def compute_region_statistics(self, regions: dict, plev, coslat: bool = False) -> tuple:
+        """Statistics of the region means (see compute_means) over all datasets, accumulated by StreamingStatistics.
+        The means are computed in batches of statistics_batch datasets, so memory does not grow with the number
+        of datasets.
+        :return: (statistics, failures). statistics maps name (e.g. 'mean', 'std', 'q50') to an array
+                 (variables, regions).
+        """
+        statistics = StreamingStatistics()
+        failures = dict()
+        for start in range(0, len(self.dsetpaths), self.statistics_batch):
+            results, batch_failures = self.compute_means(regions, plev, coslat=coslat,
+                                                         paths=self.dsetpaths[start:start + self.statistics_batch])
+            failures.update(batch_failures)
+            for result in results:
+                if result is not None:
+                    statistics.add(result)
+        if statistics.empty():
+            raise Exception('No dataset could be processed')
+        return statistics.result(), failures
+
+    def compute_grid_statistics(self, area: dict, plev, bins: int = None) -> tuple:
+        """Statistics over all datasets per grid point of the area, in constant memory (see
+        TimeseriesDataset.statistics). Quantiles need bins (counters per grid point)."""
+        dataset = TimeseriesDataset(self.dsetpaths, varnames=self.varnames)
+        return dataset.statistics(plev, self.executor, area=area, bins=bins)
+
+    def compute_means(self, regions: dict, plev, coslat: bool = False, paths: list = None) -> tuple:
+        """Means of the added variables over the named regions (name -> area) for every path (default: all
+        selected datasets).
+        Results found in the cache are reused, files with missing (variable, region) entries are read once
+        for all regions.
+        :return: (results, failures). results has one array (variables, regions) per path, None for failed files.
+                 failures maps the path of every failed file to its error message.
+        """
+        paths = self.dsetpaths if paths is None else paths
+        entries = [(var, name) for var in self.varnames for name in regions]
+        keys, cached = self.__lookup(paths, {(var, name): self.__reduction(var, regions[name], plev, coslat)
+                                             for var, name in entries})
+
+        # Paths are grouped by the variables that still have to be computed (for at least one region)
+        groups = dict()
+        for i, file_keys in enumerate(keys):
+            missing = tuple(var for var in self.varnames
+                            if file_keys is None or any(file_keys[(var, name)] not in cached for name in regions))
+            if missing:
+                groups.setdefault(missing, []).append(i)
+
+        computed = dict()
+        failures = dict()
+        for missing, indices in groups.items():
+            # Only PRESS and the missing variables are opened, other variables of the files are dropped
+            group_paths = [paths[i] for i in indices]
+            try:
+                dataset = TimeseriesDataset(group_paths, varnames=list(missing))
+                group_means, group_failures = dataset.region_means(regions, plev, self.executor, coslat=coslat)
+            except Exception as e:
+                failures.update({path: repr(e) for path in group_paths})
+                continue
+            failures.update(group_failures)
+            for i, path, means in zip(indices, group_paths, group_means.values):
+                if path not in group_failures:
+                    computed[i] = {(var, name): means[v, r] for v, var in enumerate(missing)
+                                   for r, name in enumerate(regions)}
+        self.__store(keys, computed)
+
+        results = []
+        for i, file_keys in enumerate(keys):
+            values = {entry: cached[key] for entry, key in file_keys.items() if key in cached} if file_keys else dict()
+            values.update(computed.get(i, dict()))
+            if len(values) == len(entries):
+                results.append(np.array([[values[(var, name)] for name in regions] for var in self.varnames],
+                                        dtype=float))
+            else:
+                results.append(None)
+        return results, failures
+
+    def compute_resampled_means(self, regions: dict, plev, rule: str, file_dates: list, coslat: bool = False) -> tuple:
+        """Region means (see compute_means) aggregated per time bucket (rule: 'daily', 'monthly' or 'seasonal').
+        The aggregates of complete buckets are stored in the cache, keyed by the files of the bucket. A bucket is
+        only recomputed if its files changed, e.g. extending the range only computes the new buckets.
+        :return: (bucket starts, means, failures). means has one array (variables, regions) per bucket.
+        """
+        starts = bucket_starts(file_dates, rule)
+        members = dict()  # Bucket start -> indices of its files
+        for i, start in enumerate(starts):
+            members.setdefault(start, []).append(i)
+
+        keys = dict()  # Bucket start -> (variable, region) -> cache key
+        cached = dict()
+        if self.cache is not None:
+            for start, indices in members.items():
+                try:
+                    identity = [ResultCache.file_identity(self.dsetpaths[i]) for i in indices]
+                except OSError:
+                    continue
+                keys[start] = {(var, name): ResultCache.key(identity, self.__bucket_reduction(var, regions[name], plev,
+                                                                                             coslat, rule))
+                               for var in self.varnames for name in regions}
+            cached = self.cache.get_many([key for bucket_keys in keys.values() for key in bucket_keys.values()])
+
+        resampler = TemporalResampler(rule)
+        missing = []
+        for start, indices in members.items():
+            bucket_keys = keys.get(start)
+            if bucket_keys is not None and all(key in cached for key in bucket_keys.values()):
+                entries = [[cached[bucket_keys[(var, name)]] for name in regions] for var in self.varnames]
+                resampler.set(start, [[entry['count'] for entry in row] for row in entries],
+                              [[entry['mean'] for entry in row] for row in entries])
+            else:
+                missing.extend(indices)
+
+        results, failures = self.compute_means(regions, plev, coslat=coslat,
+                                               paths=[self.dsetpaths[i] for i in missing])
+        for i, result in zip(missing, results):  # Running aggregates, file by file
+            if result is not None:
+                resampler.add(starts[i], result)
+
+        if self.cache is not None:  # Buckets with failed files are not stored, they are retried next time
+            complete = {starts[i] for i in missing} - {starts[i] for i in missing if self.dsetpaths[i] in failures}
+            new_entries = dict()
+            for start in complete:
+                if start in keys and start in resampler.buckets:
+                    count, mean = resampler.get(start)
+                    for v, var in enumerate(self.varnames):
+                        for r, name in enumerate(regions):
+                            new_entries[keys[start][(var, name)]] = {'count': count[v, r], 'mean': mean[v, r]}
+            self.cache.put_many(new_entries)
+        bucket_dates, means = resampler.result()
+        return bucket_dates, means, failures
+
+    def __lookup(self, paths: list, reductions: dict) -> tuple:
+        """Cache keys of the reductions (entry -> description) of every path and the values found in the cache.
+        :return: (keys, cached). keys has one dictionary entry -> cache key per path, None if there is no cache or
+                 the file is missing. cached maps the keys found in the cache to their values.
+        """
+        keys = []
+        for path in paths:
+            try:
+                identity = ResultCache.file_identity(path) if self.cache is not None else None
+            except OSError:
+                identity = None
+            keys.append(None if identity is None else
+                        {entry: ResultCache.key(identity, reduction) for entry, reduction in reductions.items()})
+        cached = dict()
+        if self.cache is not None:
+            cached = self.cache.get_many([key for file_keys in keys if file_keys for key in file_keys.values()])
+        return keys, cached
+
+    def __store(self, keys: list, computed: dict):
+        """Stores the computed values (path index -> entry -> value) under their keys (see __lookup)"""
+        if self.cache is not None:
+            self.cache.put_many({keys[i][entry]: value for i, values in computed.items() if keys[i] is not None
+                                 for entry, value in values.items()})
+
+    def __report_failures(self, failures: dict):
+        if failures:
+            with dbg:
+                print(f"{len(failures)} of {len(self.dsetpaths)} datasets could not be processed:")
+                for path, error in failures.items():
+                    print(f"  {path}: {error}")
+
+    @staticmethod
+    def __reduction(var, area, plev, coslat) -> dict:
+        """Description of a mean for the cache"""
+        reduction = {'op': 'mean', 'var': var, 'area': area, 'plev': plev}
+        if coslat:
+            reduction['weighting'] = 'coslat'
+        return reduction
+
+    @staticmethod
+    def __bucket_reduction(var, area, plev, coslat, rule) -> dict:
+        """Description of the aggregate of a time bucket for the cache"""
+        reduction = TimeseriesModel.__reduction(var, area, plev, coslat)
+        reduction.update({'op': 'resample', 'rule': rule})
+        return reduction
+
     def set_vars(self, vars: list):
         self.varnames = []
         for varname in vars:
             if varname not in TimeseriesModel.all_variable_names:
                 raise Exception(f'{varname} is not a viable variable name')
-            if len(self.varnames) >= maxvars:
-                raise Exception(f"Couldnt add {varname}. Maximum of {maxvars} variables already reached")
             self.varnames.append(varname)
 
+    def add_region(self, name: str, area: dict):
+        if not name:
+            raise Exception('Region needs a name')
+        self.regions[name] = dict(area)
+
+    def remove_region(self, name: str):
+        self.regions.pop(name, None)
+
     def set_paths(self, pathlist: list):
         self.dsetpaths = pathlist
 
+    def set_workers(self, workers: int):
+        """Sets number of parallel workers. 1 processes the datasets serially."""
+        self.executor.set_workers(workers)
+
 #  tmp = Model()
 #  tmp.open_dset(dropvars=vars_to_drop)  # Normally give path
 #  units = []
@@ -2,14 +2,14 @@ import ipywidgets as widgets
 from IPython.core.display import display
 import cartopy.crs as ccrs
 import matplotlib.pyplot as plt
-from os import path
+from os import path, cpu_count
 
 from SingleDataset.AreaSelection import AreaSelection
 from Timeseries.MultipleFilePicker import MultipleFilePicker
 from Timeseries.TimeseriesController import TimeseriesController
 from Timeseries.TimeseriesLevel import TimeseriesLevel
 from SingleDataset.DebugCapturer import dbg
-from Timeseries.TimeseriesModel import maxvars
+from Timeseries.TemporalResampler import rules
 
 class TimeseriesView:
     def __init__(self, root_dir: path = None):
@@ -22,16 +22,53 @@ class TimeseriesView:
     def __init_widgets(self):
         plot_btn = widgets.Button(description='Plot')
         plot_btn.on_click(self.on_plot_btn_click)
-        plot_tab = widgets.HBox([plot_btn, self.controller.plot_out])
+        statistics_btn = widgets.Button(description='Statistics')
+        statistics_btn.on_click(self.on_statistics_btn_click)
+        self.plot_mode = widgets.Dropdown(options=[('Region means', 'means'), ('Time x pressure', 'plev'),
+                                                   ('Time x longitude', 'lon'), ('Time x latitude', 'lat')],
+                                          value='means', description='Plot:')
+        self.resample_selection = widgets.Dropdown(options=rules, value='none', description='Resample:')
+        self.export_path = widgets.Text(value='region_means.csv', description='CSV file:')
+        export_btn = widgets.Button(description='Export')
+        export_btn.on_click(self.on_export_btn_click)
+        plot_tab = widgets.HBox([widgets.VBox([plot_btn, self.plot_mode, statistics_btn, self.resample_selection,
+                                               widgets.HBox([self.export_path, export_btn])]),
+                                 self.controller.plot_out])
 
         self.var_select = widgets.SelectMultiple(options=self.controller.get_plottable_vars())
-        self.var_select.observe(self.var_selection_change)
 
 
-        options_tab = widgets.Accordion([self.areaSelection.get_widget(), self.var_select, self.level_selection.plevels_selection])
+        self.worker_selection = widgets.BoundedIntText(min=1, max=256, value=cpu_count() or 1,
+                                                       description='Workers:')
+
+        self.region_name = widgets.Text(description='Name:')
+        add_region_btn = widgets.Button(description='Add region')
+        add_region_btn.on_click(self.on_add_region_btn_click)
+        self.polygon_input = widgets.Textarea(placeholder='Polygon as WKT or GeoJSON', description='Polygon:')
+        add_polygon_btn = widgets.Button(description='Add polygon')
+        add_polygon_btn.on_click(self.on_add_polygon_btn_click)
+        self.region_selection = widgets.Select(description='Regions:', options=[])
+        remove_region_btn = widgets.Button(description='Remove region')
+        remove_region_btn.on_click(self.on_remove_region_btn_click)
+        self.coslat_selection = widgets.Checkbox(value=False, description='Weight with cos(latitude)')
+        regions = widgets.VBox([widgets.HBox([self.region_name, add_region_btn]),
+                                widgets.HBox([self.polygon_input, add_polygon_btn]),
+                                widgets.HBox([self.region_selection, remove_region_btn]), self.coslat_selection])
+        area_selection = widgets.VBox([self.areaSelection.get_widget(), regions])
+
+        self.profile_points = widgets.Textarea(placeholder='lat, lon; lat, lon; ...', description='Points:')
+        self.profile_path = widgets.Text(value='profiles.csv', description='CSV file:')
+        export_profiles_btn = widgets.Button(description='Export profiles')
+        export_profiles_btn.on_click(self.on_export_profiles_btn_click)
+        profiles = widgets.VBox([self.profile_points, widgets.HBox([self.profile_path, export_profiles_btn])])
+
+        options_tab = widgets.Accordion([area_selection, self.var_select, self.level_selection.get_widget(),
+                                         self.worker_selection, profiles])
         options_tab.set_title(0, 'Areaselection')
         options_tab.set_title(1, 'Select variables')
         options_tab.set_title(2, 'Pressurelevel')
+        options_tab.set_title(3, 'Parallel execution')
+        options_tab.set_title(4, 'Vertical profiles')
 
         self.main_tab = widgets.Tab([self.fp.get_widget(), options_tab, plot_tab, dbg])
         self.main_tab.set_title(0, 'Dset selection')
@@ -47,10 +84,27 @@ class TimeseriesView:
     def on_plot_btn_click(self, b):
         self.controller.plot() #  self.areaSelection.getArea()
 
-    def var_selection_change(self, change):
-        if change['name'] == 'value' and change['type'] == 'change':
-            if len(change['new']) > maxvars:
-                print(f"Too many variables selected! (more than {maxvars})")
+    def on_statistics_btn_click(self, b):
+        self.controller.show_statistics()
+
+    def on_export_btn_click(self, b):
+        self.controller.export(self.export_path.value)
+
+    def on_export_profiles_btn_click(self, b):
+        self.controller.export_profiles(self.profile_points.value, self.profile_path.value)
+
+    def on_add_region_btn_click(self, b):
+        self.controller.add_region(self.region_name.value)
+
+    def on_add_polygon_btn_click(self, b):
+        self.controller.add_polygon_region(self.region_name.value, self.polygon_input.value)
+
+    def on_remove_region_btn_click(self, b):
+        if self.region_selection.value is not None:
+            self.controller.remove_region(self.region_selection.value)
+
+    def update_regions(self, names):
+        self.region_selection.options = names
 
     def main_tab_change(self, change):
         if change['name'] == 'selected_index' and change['type'] == 'change':